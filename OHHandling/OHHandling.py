@@ -1,33 +1,141 @@
 import discord
+import os
+from collections import OrderedDict
+from asyncio import ensure_future, gather, get_event_loop, Semaphore, sleep, TimeoutError, wait_for
+from datetime import datetime
+from functools import partial
+from io import BytesIO
+from time import perf_counter
 from discord.ext import commands
 from discord.utils import get as duget
 from OHHandling.ohsession import OHSession
+from OHHandling.ohsessionregistry import OHSessionRegistry
 from OHHandling.ohqueue import OHQueue
+from OHHandling.ohqueueentry import OHQueueEntry
+from OHHandling.ohqueueboard import OHQueueBoard
+from OHHandling.ohnotifier import OHNotifier, OHDigest
+from OHHandling.ohroompool import OHRoomPool
+from OHHandling.ohtranscript import OHTranscriptWriter
+from OHHandling.ohattachments import OHAttachmentStore
+from OHHandling.oharchive import OHArchive
+from OHHandling.ohstore import OHStore, open_store
+from OHHandling.ohmetrics import OHMetrics
+from OHHandling.ohresources import OHResources
+from OHHandling.ohtimers import OHTimers
+from OHHandling.ohevents import OHEventLog
+from OHHandling.ohactor import OHGuildActor
+from OHHandling.ohguilddict import OHGuildDict
+from OHHandling.ohcollector import OHRoomCollector
 import OHHandling.ohexceptions as exceptions
 
 class OHHandling(commands.Cog):
+    # keep warm, hidden session rooms around so !accept and !close don't have
+    # to create and delete a role and three channels every time
+    USE_ROOM_POOL = False
+
+    # discord allows at most 10 files on a single message
+    MAX_LOGS_SENT = 10
+
+    # how long restoring a guild may spend fetching members that aren't cached,
+    # and how many of those fetches run at once
+    RESTORE_TIMEOUT = 10.0
+    RESTORE_FETCHES = 10
+
+    # where and how often the metrics are written for Prometheus to pick up
+    METRICS_FILE = "OHHandling/metrics.prom"
+    METRICS_INTERVAL = 60
+
+    # where the queues, sessions and duty statuses are kept: memory://,
+    # sqlite:///<path> or redis://<host>:<port>/<db>, from $OH_STATE_BACKEND.
+    # Shard processes that share a SQLite file or a redis server also share
+    # their presence count
+    STATE_BACKEND = os.environ.get("OH_STATE_BACKEND", "sqlite:///" + OHStore.PATH)
+
+    # how often this process reports its accepting guilds and picks up those of
+    # the other shard processes
+    PRESENCE_INTERVAL = 60
+
+    # keep each !stats field well under discord's 1024 character limit
+    MAX_STATS_ROWS = 10
+
+    # reactions that page through a queue embed, and how many paged embeds are
+    # remembered before the oldest stop responding
+    PAGE_REACTIONS = ("\u25c0\ufe0f", "\u25b6\ufe0f")
+    MAX_PAGED_MESSAGES = 100
+
+    # the longest a handler can have their queue notifications held for a digest
+    MAX_DIGEST_WINDOW = 60 * 60
+
+    # how often every guild is swept for session rooms left behind by a process
+    # that died mid-session, and whether their text channels are archived first
+    COLLECT_INTERVAL = 60 * 60
+    ARCHIVE_ORPHANS = True
+
     def __init__(self, bot):
         self._bot = bot
         self._num_guilds_accepting = 0
-        self._queues = {}
-        self._open_sessions = {}
-        self._handlers_on_duty = {}
-        self._notify_channel = {}
+        # a guild's state is created the first time anything looks it up, so
+        # guilds that never hold office hours cost nothing
+        self._actors = OHGuildDict(self._init_guild_id)
+        self._queues = OHGuildDict(self._init_guild_id)
+        self._open_sessions = OHGuildDict(self._init_guild_id)
+        self._handlers_on_duty = OHGuildDict(self._init_guild_id)
+        self._resources = OHResources()
+        self._notifier = OHNotifier()
+        self._digests = OHGuildDict(self._init_guild_id)
+        self._digest_windows = {}
+        self._room_pools = {}
+        self._boards = OHGuildDict(self._init_guild_id)
+        # the guilds whose stored state this process has already restored
+        self._restored = set()
+        self._timers = OHTimers()
+        self._paged = OrderedDict()
+        self._archive = OHArchive()
+        self._transcripts = OHTranscriptWriter(self._archive, OHAttachmentStore())
+        self._collector = OHRoomCollector(self._transcripts)
+        self._collect_task = None
+        self._store = open_store(self.STATE_BACKEND)
+        self._presence = None
+        self._presence_task = None
+        self._events = OHEventLog(OHQueue.LANES)
+        self._metrics = OHMetrics()
+        self._metrics_task = None
+        self._metrics.instrument_http(bot.http)
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: on_ready()
     :preconditions: Bot is running and this cog is loaded.
-    :postconditions: All member dictionaries are initialized with discord.Guild.id keys.
+    :postconditions: The queue, sessions and on duty handlers of every guild with
+                     anything in the store are restored, unless this process
+                     already restored it. Every other guild's state is
+                     created when it is first used.
     """""""""""""""""""""""""""""""""""""""""""""""""""
     @commands.Cog.listener()
     async def on_ready(self) -> None:
-        for guild in self._bot.guilds:
-            self._queues[guild.id] = OHQueue(self._bot)
-            self._open_sessions[guild.id] = []
-            self._handlers_on_duty[guild.id] = {}
-            self._notify_channel[guild.id] = duget(guild.text_channels, name="queue-reasons")
+        started = perf_counter()
+        self._presence = None
+
+        # on_ready fires again whenever the bot reconnects, and the state kept
+        # while it was connected is still right, so only guilds this process
+        # hasn't restored yet are. A guild's state can already exist from an
+        # event before this, so that isn't taken to mean it was restored. They
+        # are restored concurrently, since most of the time goes to waiting on
+        # discord for members that aren't cached
+        stored = self._store.guilds()
+        restoring = [guild for guild in self._bot.guilds if guild.id in stored and guild.id not in self._restored]
+        await gather(*(self._restore(guild) for guild in restoring))
+        await self._pres_change()
+
+        if self._metrics_task is None: self._metrics_task = ensure_future(self._dump_metrics_loop())
+        if self._presence_task is None: self._presence_task = ensure_future(self._presence_loop())
 
-            print("Member variables in <%s> initialized." % guild.name)
+        # the rooms of sessions that weren't restored are only known now, so the
+        # first sweep runs right away
+        if self._collect_task is None: self._collect_task = ensure_future(self._collect_loop())
+
+        print("Ready in %d guilds, restored %d in %dms." % (
+                len(self._bot.guilds), len(restoring), (perf_counter() - started) * 1000
+            ))
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: on_guild_join()
@@ -36,15 +144,11 @@ class OHHandling(commands.Cog):
     """""""""""""""""""""""""""""""""""""""""""""""""""
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild) -> None:
-        self._queues[guild.id] = OHQueue(self._bot)
-        self._open_sessions[guild.id] = []
-        self._handlers_on_duty[guild.id] = {}
+        # the guild may still have the roles and channels from a previous stay,
+        # so only the missing ones are created
+        created = await self._create_reqs(guild)
 
-        # when joining a guild, we can safely assume that it doesn't have the
-        # required roles or channels for OHHandling to work, so we create them
-        await self._create_reqs(guild)
-
-        print("Added to <%s>: created roles and channel." % guild.name)
+        print("Added to <%s>: created %d roles and channels." % (guild.name, created))
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: on_guild_remove()
@@ -55,10 +159,18 @@ class OHHandling(commands.Cog):
     """""""""""""""""""""""""""""""""""""""""""""""""""
     @commands.Cog.listener()
     async def on_guild_remove(self, guild: discord.Guild) -> None:
-        del self._queues[guild.id]
-        del self._open_sessions[guild.id]
-        del self._handlers_on_duty[guild.id]
-        del self._notify_channel[guild.id]
+        # the guild's state may never have been created
+        for states in (self._actors, self._queues, self._open_sessions, self._handlers_on_duty):
+            states.pop(guild.id, None)
+        self._resources.forget(guild.id)
+        self._room_pools.pop(guild.id, None)
+        self._restored.discard(guild.id)
+        self._timers.cancel(("end_oh", guild.id))
+        board = self._boards.pop(guild.id, None)
+        if board is not None: board.stop()
+        digest = self._digests.pop(guild.id, None)
+        if digest is not None: digest.stop()
+        self._store.forget_guild(guild.id)
 
         print("Removed from <%s>, deleting it from member variables." % guild.name)
 
@@ -70,22 +182,110 @@ class OHHandling(commands.Cog):
     """""""""""""""""""""""""""""""""""""""""""""""""""
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member) -> None:
-        queueable = duget(member.guild.roles, name="Queueable")
+        queueable = self._resources.role(member.guild, "Queueable")
         await member.add_roles(queueable)
 
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: on_guild_role_create() / on_guild_role_delete() / on_guild_role_update()
+    :preconditions: A discord.Role instance was created, deleted or edited in a guild.
+    :postconditions: Any cached lookup under the role's old or new name is dropped.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role) -> None:
+        self._resources.invalidate(role.guild.id, "role", role.name)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        self._resources.invalidate(role.guild.id, "role", role.name)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        if before.name == after.name: return
+
+        self._resources.invalidate(before.guild.id, "role", before.name)
+        self._resources.invalidate(after.guild.id, "role", after.name)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: on_guild_channel_create() / on_guild_channel_delete() / on_guild_channel_update()
+    :preconditions: A channel was created, deleted or edited in a guild.
+    :postconditions: Any cached lookup under the channel's old or new name is dropped.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        self._resources.invalidate(channel.guild.id, "channel", channel.name)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self._resources.invalidate(channel.guild.id, "channel", channel.name)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel,
+                                      after: discord.abc.GuildChannel) -> None:
+        if before.name == after.name: return
+
+        self._resources.invalidate(before.guild.id, "channel", before.name)
+        self._resources.invalidate(after.guild.id, "channel", after.name)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: on_reaction_add()
+    :preconditions: A reaction was added to a message the bot has cached.
+    :postconditions: If the message is a paged queue embed and the reaction is one
+                     of PAGE_REACTIONS, the embed is moved a page back or forward.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.Cog.listener()
+    async def on_reaction_add(self, reaction: discord.Reaction, user: discord.User) -> None:
+        if user.bot or str(reaction.emoji) not in self.PAGE_REACTIONS: return
+
+        paged = self._paged.get(reaction.message.id)
+        queue = self._queues.get(paged[0]) if paged is not None else None
+        if queue is None: return
+
+        step = -1 if str(reaction.emoji) == self.PAGE_REACTIONS[0] else 1
+        page = max(0, min(paged[1] + step, queue.page_count() - 1))
+        self._paged[reaction.message.id] = (paged[0], page)
+        await reaction.message.edit(embed=queue.queue_emb(page))
+
+        # take the reaction back off so it can be pressed again; this needs the
+        # Manage Messages permission, and paging works without it
+        try:
+            await reaction.remove(user)
+        except discord.HTTPException:
+            pass
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: on_message()
+    :preconditions: A discord.Message instance was sent in a channel the bot can see.
+    :postconditions: If the message was sent in an open OHSession's text channel,
+                     it is appended to that session's transcript.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message) -> None:
+        sessions = self._open_sessions.get(message.guild.id) if message.guild is not None else None
+        session = sessions.by_channel(message.channel.id) if sessions is not None else None
+        if session is not None: await session.record(message)
+
+        return
+
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: _enqueue()
     :preconditions: At least one handler is on duty in this guild, the author has
                     the Queueable role, and the author isn't already queued.
     :postconditions: The author's discord.Member instance is appended to this
-                     guild's queue.
+                     guild's queue, in the lane named by the first word of the
+                     reason if there is one.
     """""""""""""""""""""""""""""""""""""""""""""""""""
     @commands.has_role("Queueable")
     @commands.command(name="enqueue", aliases=["queue", "request", "q"])
     @exceptions.enqueue()
     async def _enqueue(self, ctx: discord.ext.commands.Context, *reason: str) -> None:
+        # a lane on its own isn't a reason
+        lane, reason = self._queues[ctx.guild.id].parse_lane(reason)
+        if not reason: raise exceptions.NoQueueReason
+
         # attempt to enqueue the author into this guild's queue
-        await self._queues[ctx.guild.id].enqueue(ctx.author)
+        await self._in_guild(ctx.guild.id, self._enqueue_state, ctx, " ".join(reason), lane)
 
         # create an embed with relevant information to send to this guild's handlers
         embed = discord.Embed(
@@ -94,11 +294,12 @@ class OHHandling(commands.Cog):
                     timestamp=ctx.message.created_at
                 )
         embed.add_field(name="For reason:", value=" ".join(reason), inline=False)
+        embed.add_field(name="Lane:", value=lane, inline=False)
         embed.set_author(name=ctx.author.display_name, icon_url=ctx.author.avatar_url)
 
         # notify all of this guild's handlers on duty that a new person has queued
         msg = "%s Queued in <%s>." % (ctx.author.display_name, ctx.guild.name)
-        await self._handler_notify(ctx.guild.id, msg)
+        self._handler_notify(ctx.guild.id, msg)
         await self._embed_send(ctx, embed)
 
         return
@@ -114,7 +315,7 @@ class OHHandling(commands.Cog):
     @exceptions.kick()
     async def _kick(self, ctx: discord.ext.commands.Context, position: int) -> None:
         # attempt to remove person in this guild's queue at the given position
-        await self._queues[ctx.guild.id].remove(position=(position - 1))
+        await self._in_guild(ctx.guild.id, self._kick_state, ctx, position - 1)
         await ctx.send("Success.")
 
         return
@@ -131,7 +332,41 @@ class OHHandling(commands.Cog):
     async def _current_queue(self, ctx: discord.ext.commands.Context) -> None:
         # make sure this isn't in a DM channel
         if ctx.message.channel is discord.DMChannel: raise exceptions.CommandInDM
-        await ctx.send(embed=self._queues[ctx.guild.id].queue_emb())
+
+        # long queues are split into pages that can be flipped through with
+        # reactions
+        queue = self._queues[ctx.guild.id]
+        message = await ctx.send(embed=queue.queue_emb())
+        if queue.page_count() > 1:
+            self._paged[message.id] = (ctx.guild.id, 0)
+            while len(self._paged) > self.MAX_PAGED_MESSAGES: self._paged.popitem(last=False)
+
+            for reaction in self.PAGE_REACTIONS: await message.add_reaction(reaction)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _eta()
+    :preconditions: The author has either the Handler role or Queueable role
+                    in this guild.
+    :postconditions: The author's position and estimated wait are sent, or the ones
+                     they would get by queueing in the given lane now.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.has_any_role("Handler", "Queueable")
+    @commands.command(name="eta", aliases=["wait", "howlong"])
+    @exceptions.office_hours_exceptions()
+    async def _eta(self, ctx: discord.ext.commands.Context, lane: str = None) -> None:
+        # make sure this isn't in a DM channel
+        if ctx.message.channel is discord.DMChannel: raise exceptions.CommandInDM
+
+        queue = self._queues[ctx.guild.id]
+        if len(self._handlers_on_duty[ctx.guild.id]) == 0: raise exceptions.OfficeHoursClosed
+
+        position, wait = queue.eta(ctx.author.id, queue.check_lane(lane or queue.DEFAULT_LANE))
+        if queue.check(ctx.author.id):
+            await ctx.send("You're at position %d. Estimated wait: %s." % (position, wait))
+        else:
+            await ctx.send("If you queued now, you'd be at position %d. Estimated wait: %s." % (position, wait))
 
         return
 
@@ -148,8 +383,8 @@ class OHHandling(commands.Cog):
     async def _dequeue(self, ctx: discord.ext.commands.Context) -> None:
         # remove the author from this guild's queue and notify all of this guild's
         # handlers on duty that the author has been removed
-        await self._queues[ctx.guild.id].remove(student=ctx.author)
-        await self._handler_notify(ctx.guild.id, "%s left the queue." % ctx.author.display_name)
+        await self._in_guild(ctx.guild.id, self._dequeue_state, ctx)
+        self._handler_notify(ctx.guild.id, "%s left the queue in <%s>." % (ctx.author.display_name, ctx.guild.name))
 
         return
 
@@ -157,22 +392,45 @@ class OHHandling(commands.Cog):
     :name: _accept()
     :preconditions: The author is not currently handling a session, has the Handler
                     role, and has the On Duty role.
-    :postconditions: A new instance of OHSession is created, opened, and is
-                     appended to this guild's open_sessions.
+    :postconditions: The student due first in this guild's queue, or in the given
+                     lane of it, is taken from the queue. A new instance of OHSession
+                     is created, opened, and is added to this guild's open_sessions.
     """""""""""""""""""""""""""""""""""""""""""""""""""
     @commands.has_role("Handler")
     @commands.command(name="accept", aliases=["take", "yoink"])
     @exceptions.accept()
-    async def _accept(self, ctx: discord.ext.commands.Context) -> None:
-        # create a new OHSession, open it for use, then store it in the value
-        # for this guild's open_sessions
-        new_session = OHSession(ctx.author, await self._queues[ctx.guild.id].dequeue())
-        await new_session.open(ctx.guild)
-        self._open_sessions[ctx.guild.id].append(new_session)
+    async def _accept(self, ctx: discord.ext.commands.Context, lane: str = None) -> None:
+        # take the student in this guild's turn, then open the session outside
+        # of it so the rest of the guild's commands aren't held up by the
+        # channels being made
+        with self._metrics.timer("step.dequeue", ctx.guild.id):
+            entry = await self._in_guild(ctx.guild.id, self._accept_state, ctx, lane and lane.lower())
+
+        try:
+            # the queue only keeps the student's id, so this is where they're
+            # looked up, usually from the cache
+            student = (await self._resolve_members(ctx.guild, {entry.member_id})).get(entry.member_id)
+            if student is None: raise exceptions.StudentLeft(entry.name)
+
+            # if this guild keeps a pool of warm rooms, hand one to the new session
+            pool = self._room_pools.get(ctx.guild.id)
+            room = pool.take() if pool is not None else None
+
+            new_session = OHSession(ctx.author, student, self._transcripts)
+            with self._metrics.timer("step.session_open", ctx.guild.id):
+                await new_session.open(ctx.guild, room)
+        except Exception:
+            await self._in_guild(ctx.guild.id, self._open_sessions[ctx.guild.id].release, ctx.author.id)
+            raise
+
+        # registering the session starts recording its text channel, then pick
+        # up anything that was said while the session was still being opened
+        await self._in_guild(ctx.guild.id, self._opened_state, ctx, new_session)
+        await new_session.catch_up()
 
-        # send the current queue after a student's acceptance for other Handler's
-        # reference
-        await ctx.send(embed=self._queues[ctx.guild.id].queue_emb())
+        # record how long each step of opening the session took
+        for step, seconds in new_session.get_timings().items():
+            self._metrics.observe("session_open.%s" % step, seconds)
 
         return
 
@@ -181,19 +439,58 @@ class OHHandling(commands.Cog):
     :preconditions: The author is currently handling a session, has the Handler
                     role, and has the On Duty role.
     :postconditions: The OHSession instance that the handler has open in this guild is
-                     closed and removed from this guild's open_sessions list.
+                     closed and removed from this guild's open_sessions.
     """""""""""""""""""""""""""""""""""""""""""""""""""
     @commands.has_role("Handler")
     @commands.command(name="close", aliases=["finish", "finishup", "finished", "done"])
     @exceptions.close()
     async def _close(self, ctx: discord.ext.commands.Context) -> None:
-        # iterate through all open sessions and find the one that the author is handling
-        # once found, close the session and remove it from the open sessions
-        for session in self._open_sessions[ctx.guild.id]:
-            if session.get_members()["handler"] == ctx.author:
-                await session.close(ctx)
-                self._open_sessions[ctx.guild.id].remove(session)
-                return
+        # find the session that the author is handling and stop tracking it in
+        # this guild's turn, then close it outside of it
+        session = await self._in_guild(ctx.guild.id, self._close_state, ctx)
+        if session is None: return
+
+        with self._metrics.timer("step.session_close", ctx.guild.id):
+            try:
+                await session.close(ctx, self._room_pools.get(ctx.guild.id))
+            finally:
+                await self._in_guild(ctx.guild.id, self._closed_state, ctx, session)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _logs()
+    :preconditions: The author has the Handler role in this guild.
+    :postconditions: The most recent archived session logs of the given student in
+                     this guild, optionally only those from the given YYYY-MM-DD
+                     date, are sent as files.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.has_role("Handler")
+    @commands.command(name="logs", aliases=["sessionlogs", "history"])
+    @exceptions.office_hours_exceptions()
+    async def _logs(self, ctx: discord.ext.commands.Context, student: discord.Member, date: str = None) -> None:
+        # make sure this isn't in a DM channel
+        if ctx.message.channel is discord.DMChannel: raise exceptions.CommandInDM
+
+        # validate the date so a typo reads as "nothing found" rather than an error
+        if date is not None:
+            try: date = datetime.strptime(date, "%Y-%m-%d").date().isoformat()
+            except ValueError: raise exceptions.NoSessionLogs
+
+        # finding the logs can load the guild's index, and waits on the archive's
+        # lock while the writer thread stores a transcript, so like reading and
+        # decompressing them it happens off the event loop
+        loop = get_event_loop()
+        entries = await loop.run_in_executor(None, partial(self._archive.find, ctx.guild.id, student_id=student.id, date=date))
+        entries = entries[-self.MAX_LOGS_SENT:]
+        if not entries: raise exceptions.NoSessionLogs
+
+        files = []
+        for entry in entries:
+            data = await loop.run_in_executor(None, self._archive.read, ctx.guild.id, entry)
+            files.append(discord.File(BytesIO(data), filename=entry.name))
+
+        await ctx.send("Session logs for %s:" % student.display_name, files=files)
 
         return
 
@@ -207,22 +504,12 @@ class OHHandling(commands.Cog):
     @commands.command(name="onduty", aliases=["on"])
     @exceptions.on_duty()
     async def _on_duty(self, ctx: discord.ext.commands.Context) -> None:
-        duty_role = duget(ctx.guild.roles, name="On Duty")
+        duty_role = self._resources.role(ctx.guild, "On Duty")
 
-        # add On Duty to the author and add their object to this guild's
-        # handlers_on_duty.
+        # add On Duty to the author, then add their object to this guild's
+        # handlers_on_duty in this guild's turn
         await ctx.author.add_roles(duty_role)
-        self._handlers_on_duty[ctx.guild.id][ctx.author.id] = ctx.author
-
-        # if no other handlers were on duty before this handler, add to the
-        # num_guilds_accepting and change the client's presence
-        # we will also set the queue's accepting bool to true in case students
-        # are about to be wiped from it
-        if len(self._handlers_on_duty[ctx.guild.id]) == 1:
-            self._num_guilds_accepting += 1
-            await self._pres_change()
-
-            self._queues[ctx.guild.id].accepting(True)
+        if await self._in_guild(ctx.guild.id, self._on_duty_state, ctx): await self._pres_change()
 
         return
 
@@ -238,36 +525,492 @@ class OHHandling(commands.Cog):
     @exceptions.off_duty()
     async def _off_duty(self, ctx: discord.ext.commands.Context) -> None:
         # retrieve the On Duty role for checking and adding
-        duty_role = duget(ctx.guild.roles, name="On Duty")
+        duty_role = self._resources.role(ctx.guild, "On Duty")
 
-        # take the On Duty role from the author and remove their discord.Member
-        # from instance from this guild's handlers_on_duty.
+        # remove the author's discord.Member instance from this guild's
+        # handlers_on_duty in this guild's turn, then take the On Duty role
+        closing = await self._in_guild(ctx.guild.id, self._off_duty_state, ctx)
         await ctx.author.remove_roles(duty_role)
+        if closing: await self._pres_change()
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _stats()
+    :preconditions: The author has the Handler role in this guild.
+    :postconditions: The latency percentiles of every command and step, this guild's
+                     counters, and the most used REST routes are sent, and the
+                     metrics file is rewritten.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.has_role("Handler")
+    @commands.command(name="stats", aliases=["metrics"])
+    @exceptions.office_hours_exceptions()
+    async def _stats(self, ctx: discord.ext.commands.Context) -> None:
+        # make sure this isn't in a DM channel
+        if ctx.message.channel is discord.DMChannel: raise exceptions.CommandInDM
+
+        ms = lambda seconds: "%.1f" % (seconds * 1000)
+        latency = lambda prefix: "\n".join(
+            "%s: %s / %s / %sms (%d)" % (name, *map(ms, percentiles), n)
+            for name, percentiles, n in self._metrics.summary(prefix)[:self.MAX_STATS_ROWS]
+        ) or "Nothing yet."
+
+        embed = discord.Embed(title="Office Hours Stats", color=discord.Color.blurple())
+        embed.add_field(name="Commands (p50 / p95 / p99)", value=latency("command."), inline=False)
+        embed.add_field(name="Steps (p50 / p95 / p99)", value=latency("step."), inline=False)
+        embed.add_field(name="This guild", value="\n".join(
+            "%s: %d" % item for item in sorted(self._metrics.guild_counters(ctx.guild.id).items())
+        ) or "Nothing yet.", inline=False)
+        embed.add_field(name="REST calls", value="\n".join(
+            "%s: %d" % item for item in self._metrics.rest_calls()[:self.MAX_STATS_ROWS]
+        ) or "Nothing yet.", inline=False)
+
+        await ctx.send(embed=embed)
+        await self._dump_metrics()
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _debounce()
+    :preconditions: The author has the Handler role in this guild.
+    :postconditions: If a window is given, queue position updates in this guild are
+                     collapsed over that many seconds. The number of updates sent
+                     and suppressed is sent back.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.has_role("Handler")
+    @commands.command(name="debounce", aliases=["posdelay"])
+    @exceptions.office_hours_exceptions()
+    async def _debounce(self, ctx: discord.ext.commands.Context, window: float = None) -> None:
+        # make sure this isn't in a DM channel
+        if ctx.message.channel is discord.DMChannel: raise exceptions.CommandInDM
+
+        queue = self._queues[ctx.guild.id]
+        if window is not None: queue.set_position_window(max(window, 0.0))
+
+        stats = queue.position_stats()
+        await ctx.send("Position updates sent: %d, suppressed: %d." % (stats["forwarded"], stats["suppressed"]))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _digest()
+    :preconditions: The author has the Handler role in this guild.
+    :postconditions: If a window is given, the author's queue notifications in every
+                     guild are collected and sent as one message every that many
+                     seconds, or sent one by one again for 0. The author's current
+                     setting is sent back.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.has_role("Handler")
+    @commands.command(name="digest", aliases=["batch"])
+    @exceptions.office_hours_exceptions()
+    async def _digest(self, ctx: discord.ext.commands.Context, window: float = None) -> None:
+        # make sure this isn't in a DM channel
+        if ctx.message.channel is discord.DMChannel: raise exceptions.CommandInDM
+
+        if window is not None:
+            window = min(max(window, 0.0), self.MAX_DIGEST_WINDOW)
+            if window > 0: self._digest_windows[ctx.author.id] = window
+            else: self._digest_windows.pop(ctx.author.id, None)
+
+            # whatever was held under the old window goes out now
+            for digest in self._digests.values(): digest.flush(ctx.author.id)
+
+        window = self._digest_windows.get(ctx.author.id)
+        if window is None: await ctx.send("You're sent every queue notification as it happens.")
+        else: await ctx.send("Your queue notifications are sent as a digest every %g seconds." % window)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _cleanup()
+    :preconditions: The author has the Handler role in this guild.
+    :postconditions: Session roles and channels in this guild that no open session
+                     or room pool owns are archived and deleted, or with --dry-run
+                     only listed. What was found is sent back.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @commands.has_role("Handler")
+    @commands.command(name="cleanup", aliases=["gc"])
+    @exceptions.office_hours_exceptions()
+    async def _cleanup(self, ctx: discord.ext.commands.Context, *flags: str) -> None:
+        # make sure this isn't in a DM channel
+        if ctx.message.channel is discord.DMChannel: raise exceptions.CommandInDM
+
+        dry_run = "--dry-run" in flags
+        orphans = await self._find_orphans(ctx.guild)
+        if orphans is None: return await ctx.send("A session is being opened, try again in a moment.")
+        if not orphans: return await ctx.send("No abandoned session rooms found.")
+
+        found = "%d roles, %d categories and %d channels" % (
+                    len(orphans.roles), len(orphans.categories), len(orphans.channels)
+                )
+        if dry_run:
+            names = sorted({resource.name for resource in orphans.roles + orphans.categories})
+            return await ctx.send("Would remove %s:\n%s" % (found, "\n".join(names[:self.MAX_STATS_ROWS])))
+
+        deleted = await self._collector.collect(ctx.guild, orphans, self.ARCHIVE_ORPHANS)
+        await ctx.send("Found %s, removed %d of them." % (found, deleted))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _in_guild()
+    :preconditions: Called from within the bot's running event loop, for a guild
+                    that has been initialized.
+    :postconditions: fxn is called with args in this guild's turn, after every
+                     change already waiting on this guild, and its result is
+                     returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def _in_guild(self, guild_id: int, fxn, *args):
+        with self._metrics.timer("step.guild_turn", guild_id):
+            return await self._actors[guild_id].run(fxn, *args)
+
+    # the _*_state methods below are each run in a guild's turn through
+    # _in_guild(). They make every change to the guild's state that a command
+    # needs, checking again what the command's decorator checked in case another
+    # command got there first, but never wait on discord; that is left to the
+    # command, before or after its turn
+
+    async def _enqueue_state(self, ctx: discord.ext.commands.Context, reason: str, lane: str) -> None:
+        if len(self._handlers_on_duty[ctx.guild.id]) == 0: raise exceptions.OfficeHoursClosed
+        if self._open_sessions[ctx.guild.id].busy(ctx.author.id): raise exceptions.InSession
+
+        await self._queues[ctx.guild.id].enqueue(ctx.author, reason, lane)
+        self._events.record(OHEventLog.ENQUEUE, ctx.guild.id, ctx.author.id, lane=lane)
+
+        return
+
+    async def _kick_state(self, ctx: discord.ext.commands.Context, position: int) -> None:
+        if self._queues[ctx.guild.id].is_empty(): raise exceptions.QueueIsEmpty
+
+        student = await self._queues[ctx.guild.id].remove(position=position)
+        self._events.record(OHEventLog.KICK, ctx.guild.id, student.member_id, ctx.author.id)
+
+        return
+
+    async def _dequeue_state(self, ctx: discord.ext.commands.Context) -> None:
+        if not self._queues[ctx.guild.id].check(ctx.author.id): raise exceptions.NotInQueue
+
+        await self._queues[ctx.guild.id].remove(student_id=ctx.author.id)
+        self._events.record(OHEventLog.LEAVE, ctx.guild.id, ctx.author.id)
+
+        return
+
+    async def _accept_state(self, ctx: discord.ext.commands.Context, lane: str) -> OHQueueEntry:
+        sessions = self._open_sessions[ctx.guild.id]
+        if ctx.author.id not in self._handlers_on_duty[ctx.guild.id]: raise exceptions.NotOnDuty
+        if sessions.busy(ctx.author.id): raise exceptions.InSession
+        if self._queues[ctx.guild.id].is_empty(lane): raise exceptions.QueueIsEmpty
+
+        # hold the handler and student as busy until the session is open, so
+        # neither can start anything else in the meantime
+        student = await self._queues[ctx.guild.id].dequeue(lane)
+        sessions.reserve(ctx.author.id, student.member_id)
+        self._events.record(OHEventLog.ACCEPT, ctx.guild.id, student.member_id, ctx.author.id)
+
+        return student
+
+    def _opened_state(self, ctx: discord.ext.commands.Context, session: OHSession) -> None:
+        self._store.open_session(ctx.guild.id, session.get_state())
+        self._open_sessions[ctx.guild.id].add(session)
+        self._resize_pool(ctx.guild.id)
+
+        return
+
+    def _close_state(self, ctx: discord.ext.commands.Context) -> OHSession:
+        session = self._open_sessions[ctx.guild.id].by_handler(ctx.author.id)
+        if session is None: return None
+
+        self._open_sessions[ctx.guild.id].remove(session)
+        self._store.close_session(ctx.guild.id, ctx.author.id)
+        self._queues[ctx.guild.id].record_service(ctx.author.id, session.get_duration())
+        self._events.record(OHEventLog.CLOSE, ctx.guild.id, session.get_student().id, ctx.author.id)
+
+        return session
+
+    def _closed_state(self, ctx: discord.ext.commands.Context, session: OHSession) -> None:
+        self._open_sessions[ctx.guild.id].closed(session)
+        self._resize_pool(ctx.guild.id)
+
+        return
+
+    def _reattached_state(self, guild_id: int, state: {str: int}, session: OHSession) -> None:
+        self._open_sessions[guild_id].unhold(state["handler_id"])
+        if session is not None: self._open_sessions[guild_id].add(session)
+        self._resize_pool(guild_id)
+
+        return
+
+    def _live_ids(self, guild_id: int) -> {int}:
+        # a room being opened can't be told apart from an abandoned one yet, so
+        # the guild is skipped until the next sweep
+        sessions = self._open_sessions[guild_id]
+        if sessions.opening(): return None
+
+        pool = self._room_pools.get(guild_id)
+        return sessions.resource_ids() | (pool.resource_ids() if pool is not None else set())
+
+    def _on_duty_state(self, ctx: discord.ext.commands.Context) -> bool:
+        if ctx.author.id in self._handlers_on_duty[ctx.guild.id]: raise exceptions.AlreadyOnDuty
+
+        self._handlers_on_duty[ctx.guild.id][ctx.author.id] = ctx.author
+        self._queues[ctx.guild.id].set_on_duty(ctx.author.id, True)
+        self._store.set_duty(ctx.guild.id, ctx.author.id, True)
+        self._events.record(OHEventLog.ON_DUTY, ctx.guild.id, ctx.author.id)
+        self._resize_pool(ctx.guild.id)
+
+        # if no other handlers were on duty before this handler, add to the
+        # num_guilds_accepting and let the command change the client's presence
+        # we will also set the queue's accepting bool to true and call off the
+        # wipe in case students are about to be wiped from it
+        if len(self._handlers_on_duty[ctx.guild.id]) != 1: return False
+
+        self._num_guilds_accepting += 1
+        self._timers.cancel(("end_oh", ctx.guild.id))
+        self._queues[ctx.guild.id].accepting(True)
+
+        return True
+
+    def _off_duty_state(self, ctx: discord.ext.commands.Context) -> bool:
+        if self._open_sessions[ctx.guild.id].busy(ctx.author.id): raise exceptions.InSession
+
+        # the author has the On Duty role, or the guard would have stopped them,
+        # but isn't on duty here; that happens when a restart couldn't restore
+        # them. Only the role and any stored duty status are left to take away
+        if ctx.author.id not in self._handlers_on_duty[ctx.guild.id]:
+            self._store.set_duty(ctx.guild.id, ctx.author.id, False)
+            return False
+
         del self._handlers_on_duty[ctx.guild.id][ctx.author.id]
+        self._queues[ctx.guild.id].set_on_duty(ctx.author.id, False)
+        self._store.set_duty(ctx.guild.id, ctx.author.id, False)
+        self._events.record(OHEventLog.OFF_DUTY, ctx.guild.id, ctx.author.id)
+        self._resize_pool(ctx.guild.id)
 
         # if this handler is the last to go off duty, subtract from num_guilds_accepting
-        # and change the client's presence
-        # we will also remove the student in the queue after 15 minutes if no
-        # handlers have gone back on duty
-        if len(self._handlers_on_duty[ctx.guild.id]) == 0:
-            self._num_guilds_accepting -= 1
-            await self._pres_change()
+        # and let the command change the client's presence
+        # we will also schedule the students in the queue to be removed after 15
+        # minutes if no handlers have gone back on duty
+        if len(self._handlers_on_duty[ctx.guild.id]) != 0: return False
+
+        self._num_guilds_accepting -= 1
+        self._queues[ctx.guild.id].accepting(False)
+        self._expire_queue(ctx.guild.id)
+
+        return True
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _init_guild()
+    :preconditions: The bot client is in the guild.
+    :postconditions: This discord.Guild.id is added as a key to all member
+                     dictionaries with empty state.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def _init_guild(self, guild: discord.Guild) -> None:
+        # an actor already running for this guild may still have commands queued
+        if guild.id not in self._actors: self._actors[guild.id] = OHGuildActor()
+        self._queues[guild.id] = OHQueue(self._bot, self._notifier, self._store, guild.id)
+
+        # a single queue board message per guild, edited as the queue changes
+        if guild.id in self._boards: self._boards[guild.id].stop()
+        self._boards[guild.id] = OHQueueBoard(
+            self._queues[guild.id],
+            lambda: self._resources.channel(guild, "queue-reasons")
+        )
+        self._queues[guild.id].watch(self._boards[guild.id].touch)
+
+        # handler notifications, sent in the background and optionally collected
+        # into one digest per handler
+        if guild.id in self._digests: self._digests[guild.id].stop()
+        self._digests[guild.id] = OHDigest(
+            self._notifier, "Queue activity in <%s>" % guild.name, self._digest_windows
+        )
+        self._open_sessions[guild.id] = OHSessionRegistry()
+        self._handlers_on_duty[guild.id] = {}
+        if self.USE_ROOM_POOL: self._room_pools[guild.id] = OHRoomPool(guild)
+
+        return
 
-            self._queues[ctx.guild.id].accepting(False)
-            await self._queues[ctx.guild.id].end_oh()
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _init_guild_id()
+    :preconditions: The guild's state was looked up before it was created.
+    :postconditions: The guild's state is created, if the bot client is in it.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def _init_guild_id(self, guild_id: int) -> None:
+        guild = self._bot.get_guild(guild_id)
+        if guild is None: raise KeyError(guild_id)
+
+        self._init_guild(guild)
 
         return
 
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _restore()
+    :preconditions: The bot client is in the guild and has just connected.
+    :postconditions: The guild's queue order, on duty handlers and open sessions
+                     are restored from the store. Anything whose members or rooms
+                     no longer exist is dropped from the store.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def _restore(self, guild: discord.Guild) -> None:
+        started = perf_counter()
+        self._restored.add(guild.id)
+        self._init_guild(guild)
+        state = self._store.load(guild.id)
+
+        # resolve every member the guild's state refers to up front, so the
+        # state itself is rebuilt in one go below
+        # the queue only keeps ids, so its students aren't resolved at all
+        ids = set(state["duty"])
+        for session in state["sessions"]: ids.update((session["handler_id"], session["student_id"]))
+        gone = set()
+        members = await self._resolve_members(guild, ids, gone)
+
+        # put students back in the order they queued
+        queue = self._queues[guild.id]
+        # the names shown in the queue are taken from the cache where possible;
+        # a mention renders as the student's name anyway
+        for member_id, reason, enqueued_at, lane in state["queue"]:
+            member = guild.get_member(member_id)
+            name = member.display_name if member is not None else "<@%d>" % member_id
+            queue.restore(OHQueueEntry(member_id, name, reason, enqueued_at, lane))
+
+        # only handlers that still have the On Duty role are on duty. One who
+        # couldn't be looked up keeps their stored status and role, and can
+        # take the role off with !offduty
+        duty_role = self._resources.role(guild, "On Duty")
+        for handler_id in state["duty"]:
+            handler = members.get(handler_id)
+            if handler is not None and duty_role in handler.roles:
+                self._handlers_on_duty[guild.id][handler_id] = handler
+                queue.set_on_duty(handler_id, True)
+            elif handler is not None or handler_id in gone:
+                self._store.set_duty(guild.id, handler_id, False)
+
+        # reattach to every session whose room survived, and clean up the rest.
+        # A session whose members couldn't be looked up is held and tried again
+        # later, rather than taken for abandoned
+        for session_state in state["sessions"]:
+            if self._unresolved(session_state, members, gone):
+                self._open_sessions[guild.id].hold(session_state)
+                continue
+
+            session = await self._reattach(guild, session_state, members)
+            if session is None: continue
+
+            self._open_sessions[guild.id].add(session)
+            await session.catch_up()
+
+        if self._handlers_on_duty[guild.id]:
+            self._num_guilds_accepting += 1
+            queue.accepting(True)
+
+        # office hours closed while the bot was down, so give the queue the
+        # same grace period as if the last handler had just gone off duty
+        elif not queue.is_empty():
+            self._expire_queue(guild.id)
+
+        self._resize_pool(guild.id)
+
+        print("Restored <%s> in %dms: %d queued, %d on duty, %d sessions." % (
+                guild.name,
+                (perf_counter() - started) * 1000,
+                len(state["queue"]),
+                len(self._handlers_on_duty[guild.id]),
+                len(self._open_sessions[guild.id])
+            ))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _retry_held()
+    :preconditions: The guild's state has been restored.
+    :postconditions: Every session held because its members couldn't be looked up
+                     is tried again. Those whose members are found are reattached,
+                     and those whose members have left are cleaned up.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def _retry_held(self, guild: discord.Guild) -> None:
+        held = self._open_sessions[guild.id].held()
+        if not held: return
+
+        ids = set()
+        for state in held: ids.update((state["handler_id"], state["student_id"]))
+        gone = set()
+        members = await self._resolve_members(guild, ids, gone)
+
+        for state in held:
+            if self._unresolved(state, members, gone): continue
+
+            session = await self._reattach(guild, state, members)
+            await self._in_guild(guild.id, self._reattached_state, guild.id, state, session)
+            if session is not None: await session.catch_up()
+
+        return
+
+    def _unresolved(self, state: {str: int}, members: {int: discord.Member}, gone: {int}) -> bool:
+        # a member is only taken to have left once discord says so
+        return any(
+            state[key] not in members and state[key] not in gone for key in ("handler_id", "student_id")
+        )
+
+    async def _reattach(self, guild: discord.Guild, state: {str: int}, members: {int: discord.Member}) -> OHSession:
+        # a session whose handler or student has left is archived and deleted
+        # rather than reattached
+        session = await OHSession.restore(
+                      guild, members.get(state["handler_id"]), members.get(state["student_id"]), self._transcripts, state
+                  )
+
+        if session is None: self._store.close_session(guild.id, state["handler_id"])
+
+        return session
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _resolve_members()
+    :preconditions: The bot client is in the guild.
+    :postconditions: A dictionary of the given ids to the guild's discord.Member
+                     instances is returned. Members that have left the guild, or
+                     couldn't be fetched within RESTORE_TIMEOUT, are left out; the
+                     ids of those that discord says have left are added to gone.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def _resolve_members(self, guild: discord.Guild, ids: {int}, gone: {int} = None) -> {int: discord.Member}:
+        members = {}
+        for member_id in ids:
+            member = guild.get_member(member_id)
+            if member is not None: members[member_id] = member
+
+        # fetch whoever isn't cached, a few at a time, for a bounded amount of time
+        limit = Semaphore(self.RESTORE_FETCHES)
+
+        async def fetch(member_id: int) -> None:
+            async with limit:
+                try:
+                    members[member_id] = await guild.fetch_member(member_id)
+                except discord.NotFound:
+                    if gone is not None: gone.add(member_id)
+                except discord.HTTPException:
+                    pass
+
+        missing = [member_id for member_id in ids if member_id not in members]
+        if missing:
+            try:
+                await wait_for(gather(*(fetch(member_id) for member_id in missing)), self.RESTORE_TIMEOUT)
+            except TimeoutError:
+                print("Timed out fetching members in <%s>." % guild.name)
+
+        return members
+
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: _handler_notify()
     :preconditions: This guild has at least one discord.Member instance in it's
                     handlers_on_duty.
     :postconditions: All discord.Member instances in this guild's handlers_on_duty
-                     are sent the passed str.
+                     are sent the passed str in the background, straight away or in
+                     their next digest.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    async def _handler_notify(self, guild_id: int, msg: str) -> None:
-        for key in self._handlers_on_duty[guild_id].keys():
-            await self._handlers_on_duty[guild_id][key].send(msg)
+    def _handler_notify(self, guild_id: int, msg: str) -> None:
+        # the notifier sends to every handler concurrently, so the command that
+        # caused this doesn't wait on any of them
+        for handler in self._handlers_on_duty[guild_id].values():
+            self._digests[guild_id].notify(handler, msg)
+
+        return
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: _embed_send()
@@ -280,51 +1023,181 @@ class OHHandling(commands.Cog):
                      #student-reasons channel.
     """""""""""""""""""""""""""""""""""""""""""""""""""
     async def _embed_send(self, context, embed) -> None:
-        channel = duget(context.guild.channels, name="queue-reasons")
-        await channel.send(embed=embed)
+        with self._metrics.timer("step.embed_send", context.guild.id):
+            channel = self._resources.channel(context.guild, "queue-reasons")
+            await channel.send(embed=embed)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _expire_queue()
+    :preconditions: Called from within the bot's running event loop, after the last
+                    handler in this guild went off duty.
+    :postconditions: This guild's queue is scheduled to be wiped once its grace
+                     period is over, replacing any wipe already scheduled.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def _expire_queue(self, guild_id: int) -> None:
+        queue = self._queues[guild_id]
+
+        def end_oh() -> None:
+            for student in queue.end_oh(): self._events.record(OHEventLog.EXPIRE, guild_id, student.member_id)
+            return
+
+        # the wipe is a change like any other, so it waits for this guild's turn
+        self._timers.schedule(("end_oh", guild_id), queue.EXPIRY, lambda: self._in_guild(guild_id, end_oh))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _resize_pool()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: If this guild keeps a pool of warm rooms, it is resized in the
+                     background to one room per on duty handler not in a session.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def _resize_pool(self, guild_id: int) -> None:
+        pool = self._room_pools.get(guild_id)
+        if pool is None: return
+
+        pool.resize(len(self._handlers_on_duty[guild_id]) - len(self._open_sessions[guild_id]))
 
         return
 
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _dump_metrics()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The metrics are written to METRICS_FILE off the event loop.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def _dump_metrics(self) -> None:
+        text = self._metrics.prometheus()
+
+        try:
+            await get_event_loop().run_in_executor(None, self._metrics.dump, self.METRICS_FILE, text)
+        except OSError as error:
+            print("Failed to write metrics: %s" % error)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _find_orphans() / _collect()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The guild's session roles and channels that no open or held
+                     session or room pool owns are returned, or None if a session is
+                     being opened. Held sessions are retried first. _collect()
+                     archives and deletes them.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def _find_orphans(self, guild: discord.Guild):
+        # a guild whose state was never created has no sessions
+        if guild.id not in self._actors: return self._collector.find(guild, set())
+
+        # sessions whose members couldn't be looked up at startup get another
+        # try first, and any still unresolved keep their rooms
+        await self._retry_held(guild)
+
+        # what is live is read in the guild's turn, so no session can be added or
+        # removed halfway through
+        live_ids = await self._in_guild(guild.id, self._live_ids, guild.id)
+        if live_ids is None: return None
+
+        return self._collector.find(guild, live_ids)
+
+    async def _collect(self, guild: discord.Guild) -> int:
+        orphans = await self._find_orphans(guild)
+        if not orphans: return 0
+
+        deleted = await self._collector.collect(guild, orphans, self.ARCHIVE_ORPHANS)
+        print("Removed %d abandoned session rooms and roles from <%s>." % (deleted, guild.name))
+
+        return deleted
+
+    async def _collect_loop(self) -> None:
+        while True:
+            results = await gather(*(self._collect(guild) for guild in self._bot.guilds), return_exceptions=True)
+            for error in results:
+                if isinstance(error, Exception): print("Failed to collect session rooms: %s" % error)
+
+            await sleep(self.COLLECT_INTERVAL)
+
+    async def _dump_metrics_loop(self) -> None:
+        while True:
+            await sleep(self.METRICS_INTERVAL)
+            await self._dump_metrics()
+
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: _pres_change()
     :preconditions: _on_duty() or _off_duty() has successfully executed and the
                     len of a guild's handlers_on_duty is greater than 0.
-    :postconditions: The client's custom status is updated to reflect the total
-                     number of guilds actively ready to create OHSessions.
+    :postconditions: This process' number of guilds actively ready to create
+                     OHSessions is reported to the store, and the client's custom
+                     status is updated to reflect the total across every shard.
     """""""""""""""""""""""""""""""""""""""""""""""""""
     async def _pres_change(self) -> None:
-        plural = "queue." if self._num_guilds_accepting == 1 else "queues."
-        new_pres = discord.Activity(name="%d %s" % (self._num_guilds_accepting, plural), type=discord.ActivityType.watching)
+        self._store.set_accepting(self._shard_key(), self._num_guilds_accepting)
+        total = self._store.total_accepting()
+
+        # changing the presence goes out over every shard's gateway, so skip it
+        # when nothing changed
+        if total == self._presence: return
+        self._presence = total
+
+        plural = "queue." if total == 1 else "queues."
+        new_pres = discord.Activity(name="%d %s" % (total, plural), type=discord.ActivityType.watching)
         await self._bot.change_presence(status=discord.Status.dnd, activity=new_pres)
 
         return
 
+    async def _presence_loop(self) -> None:
+        while True:
+            await sleep(self.PRESENCE_INTERVAL)
+            await self._pres_change()
+
+    def _shard_key(self) -> str:
+        # an AutoShardedBot runs several shards, a plain Bot at most one
+        shard_ids = getattr(self._bot, "shard_ids", None)
+        if shard_ids is None and getattr(self._bot, "shard_id", None) is not None: shard_ids = [self._bot.shard_id]
+
+        return "shards-" + ",".join(str(shard_id) for shard_id in sorted(shard_ids or [0]))
+
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: _create_reqs()
     :preconditions: The bot client has joined a guild.
     :postconditions: The guild is populated with the necessary roles and channels
-                     that are needed for office hours.
+                     that are needed for office hours. Any it already has are kept,
+                     and the number created is returned.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    async def _create_reqs(self, guild: discord.Guild) -> None:
-        # mass create all required roles for handling OHSessions
-        handler = await guild.create_role(name="Handler")
-        on_duty = await guild.create_role(name="On Duty")
-        queueable = await guild.create_role(name="Queueable")
+    async def _create_reqs(self, guild: discord.Guild) -> int:
+        created = 0
 
-        # creating permissions for an Office Hours category
-        perms = {
-            guild.default_role: discord.PermissionOverwrite(read_messages=False, send_messages=False),
-            handler: discord.PermissionOverwrite(read_messages=True, send_messages=False),
-            on_duty: discord.PermissionOverwrite(read_messages=True, send_messages=True)
-        }
+        async def role(name: str) -> discord.Role:
+            nonlocal created
+            existing = self._resources.role(guild, name)
+            if existing is not None: return existing
 
-        # create the category and the queue-reasons channel for it at the top
-        # of the channel list
-        cat = await guild.create_category(name="Office Hours", overwrites=perms)
-        await cat.edit(position=0)
-        self._notify_channel[guild.id] = await guild.create_text_channel(name="queue-reasons", category=cat)
+            created += 1
+            return await guild.create_role(name=name)
 
-        return
+        # create whichever required roles for handling OHSessions are missing,
+        # all at once
+        handler, on_duty, _ = await gather(role("Handler"), role("On Duty"), role("Queueable"))
+
+        # the queue-reasons channel needs its category, which needs the roles
+        channel = self._resources.channel(guild, "queue-reasons")
+        if channel is not None: return created
+
+        cat = duget(guild.categories, name="Office Hours")
+        if cat is None:
+            # creating permissions for an Office Hours category at the top of
+            # the channel list
+            perms = {
+                guild.default_role: discord.PermissionOverwrite(read_messages=False, send_messages=False),
+                handler: discord.PermissionOverwrite(read_messages=True, send_messages=False),
+                on_duty: discord.PermissionOverwrite(read_messages=True, send_messages=True)
+            }
+            cat = await guild.create_category(name="Office Hours", overwrites=perms, position=0)
+            created += 1
+
+        await guild.create_text_channel(name="queue-reasons", category=cat)
+
+        return created + 1
 
 def setup(bot):
     bot.add_cog(OHHandling(bot))
@@ -0,0 +1,54 @@
+import asyncio
+from collections import deque
+
+class OHGuildActor:
+    def __init__(self):
+        # everything that changes a guild's state is passed in here and run one
+        # at a time, in the order it arrived. Each guild has its own mailbox, so
+        # a busy guild never holds up another one
+        self._mailbox = deque()
+        self._worker = None
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: run()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: fxn is called with args once everything already in the mailbox
+                     has run, and its result is returned or its exception raised. If
+                     it returns a coroutine, nothing else in the mailbox runs until
+                     the coroutine has finished.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def run(self, fxn, *args):
+        future = asyncio.get_event_loop().create_future()
+        self._mailbox.append((fxn, args, future))
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+        return await future
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: __len__()
+    :preconditions: OHGuildActor has been instantiated.
+    :postconditions: The number of calls waiting in the mailbox is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def __len__(self) -> int:
+        return len(self._mailbox)
+
+    async def _run(self) -> None:
+        # the worker stops once the mailbox is empty and is started again by the
+        # next call, so an idle guild costs nothing
+        while self._mailbox:
+            fxn, args, future = self._mailbox.popleft()
+
+            # the caller gave up waiting (its command was cancelled)
+            if future.cancelled(): continue
+
+            try:
+                result = fxn(*args)
+                if asyncio.iscoroutine(result): result = await result
+            except Exception as error:
+                if not future.cancelled(): future.set_exception(error)
+            else:
+                if not future.cancelled(): future.set_result(result)
+
+        return
@@ -0,0 +1,192 @@
+import argparse
+from glob import glob
+from json import loads
+from os import path
+from OHHandling.ohevents import OHEventLog
+
+# numpy is only needed to analyse the event logs, not to run the bot
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the queues are run on eastern time, the same as the session logs' timestamps
+UTC_OFFSET = -5 * 60 * 60
+
+def _dtype():
+    return np.dtype([
+        ("time", "<f8"),
+        ("kind", "u1"),
+        ("lane", "u1"),
+        ("guild", "<u8"),
+        ("member", "<u8"),
+        ("actor", "<u8")
+    ])
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+:name: load_events()
+:preconditions: numpy is installed.
+:postconditions: Every event in the directory's log files, optionally only those
+                 of one guild, is returned as one structured array sorted by time,
+                 along with the lane names its lane codes refer to.
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+def load_events(directory: str = OHEventLog.DIRECTORY, guild_id: int = None) -> ("np.ndarray", [str]):
+    if np is None: raise RuntimeError("ohanalytics needs numpy installed.")
+
+    dtype, lanes, chunks = _dtype(), [], []
+    assert dtype.itemsize == OHEventLog.RECORD.size
+
+    for file_name in sorted(glob(path.join(directory, "events-*.bin"))):
+        with open(file_name, 'rb') as file:
+            if file.readline() != OHEventLog.MAGIC: continue
+            file_lanes = loads(file.readline())
+            data = file.read()
+
+        # a record cut short by a crash is dropped
+        events = np.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype).copy()
+
+        # renumber the file's lane codes into one list of lanes for every file
+        for lane in file_lanes:
+            if lane not in lanes: lanes.append(lane)
+        remap = np.array([0] + [lanes.index(lane) + 1 for lane in file_lanes], dtype="u1")
+        events["lane"] = remap[np.minimum(events["lane"], len(file_lanes))]
+
+        chunks.append(events)
+
+    events = np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+    if guild_id is not None: events = events[events["guild"] == guild_id]
+
+    return events[np.argsort(events["time"], kind="stable")], lanes
+
+def _pair(events, keys: (str,), starts: [int], ends: [int]):
+    # only the kinds being paired are kept, so nothing else recorded against the
+    # same keys (a handler's !kick mid-session) can come between a start and its end
+    e = events[np.isin(events["kind"], tuple(starts) + tuple(ends))]
+
+    # sort by (guild, *keys, time) so that each start is directly followed by
+    # whatever ended it, then match neighbouring rows in one pass
+    order = np.lexsort((e["time"],) + tuple(e[key] for key in reversed(keys)) + (e["guild"],))
+    e = e[order]
+
+    first, second = e[:-1], e[1:]
+    matched = (
+        np.isin(first["kind"], starts)
+        & np.isin(second["kind"], ends)
+        & (first["guild"] == second["guild"])
+    )
+    for key in keys: matched &= first[key] == second[key]
+
+    return first[matched], second[matched]
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+:name: wait_times()
+:preconditions: events was returned by load_events().
+:postconditions: For every student who left the queue, the enqueue event, the
+                 event that ended their wait, and the wait in seconds are returned.
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+def wait_times(events) -> ("np.ndarray", "np.ndarray", "np.ndarray"):
+    ends = (OHEventLog.ACCEPT, OHEventLog.LEAVE, OHEventLog.KICK, OHEventLog.EXPIRE)
+    queued, ended = _pair(events, ("member",), (OHEventLog.ENQUEUE,), ends)
+
+    return queued, ended, ended["time"] - queued["time"]
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+:name: wait_distribution()
+:preconditions: events was returned by load_events().
+:postconditions: The number of students accepted and the p50/p90/p99 of how long
+                 they waited are returned, overall and for every lane.
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+def wait_distribution(events, lanes: [str]) -> {str: (int, [float])}:
+    queued, ended, waits = wait_times(events)
+    accepted = ended["kind"] == OHEventLog.ACCEPT
+
+    groups = {"all": accepted}
+    for code, lane in enumerate(lanes, 1): groups[lane] = accepted & (queued["lane"] == code)
+
+    return {
+        name: (int(mask.sum()), list(np.percentile(waits[mask], (50, 90, 99))) if mask.any() else [0.0] * 3)
+        for name, mask in groups.items()
+    }
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+:name: handler_throughput()
+:preconditions: events was returned by load_events().
+:postconditions: For every handler, the number of sessions they closed, their mean
+                 session length in seconds, and the sessions they closed per hour
+                 on duty are returned.
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+def handler_throughput(events) -> {int: (int, float, float)}:
+    # a session is its handler's accept and close of the same student
+    opened, closed = _pair(events, ("actor", "member"), (OHEventLog.ACCEPT,), (OHEventLog.CLOSE,))
+    on, off = _pair(events, ("member",), (OHEventLog.ON_DUTY,), (OHEventLog.OFF_DUTY,))
+
+    handlers, sessions = np.unique(closed["actor"], return_counts=True)
+    lengths = np.bincount(np.searchsorted(handlers, closed["actor"]), weights=closed["time"] - opened["time"],
+                          minlength=len(handlers))
+
+    # hours on duty, for the handlers that closed a session
+    on_duty = off["member"]
+    known = np.isin(on_duty, handlers)
+    hours = np.bincount(np.searchsorted(handlers, on_duty[known]), weights=(off["time"] - on["time"])[known],
+                        minlength=len(handlers)) / 3600
+
+    return {
+        int(handler): (int(n), float(length / n), float(n / hour) if hour > 0 else 0.0)
+        for handler, n, length, hour in zip(handlers, sessions, lengths, hours)
+    }
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+:name: load_heatmap()
+:preconditions: events was returned by load_events().
+:postconditions: A 7x24 array (Monday first, eastern time) of how many students
+                 queued in each hour of the week, and one of their mean wait in
+                 seconds, are returned.
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+def load_heatmap(events) -> ("np.ndarray", "np.ndarray"):
+    queued, ended, waits = wait_times(events)
+    enqueues = events[events["kind"] == OHEventLog.ENQUEUE]
+
+    def cells(times):
+        local = times + UTC_OFFSET
+        # the epoch was a Thursday
+        return (np.floor_divide(local, 86400).astype(np.int64) + 3) % 7, (local % 86400 // 3600).astype(np.int64)
+
+    counts = np.zeros((7, 24))
+    np.add.at(counts, cells(enqueues["time"]), 1)
+
+    total_wait, waited = np.zeros((7, 24)), np.zeros((7, 24))
+    np.add.at(total_wait, cells(queued["time"]), waits)
+    np.add.at(waited, cells(queued["time"]), 1)
+
+    return counts, np.divide(total_wait, waited, out=np.zeros((7, 24)), where=waited > 0)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarise the office hours event logs.")
+    parser.add_argument("directory", nargs="?", default=OHEventLog.DIRECTORY)
+    parser.add_argument("--guild", type=int, default=None)
+    args = parser.parse_args()
+
+    events, lanes = load_events(args.directory, args.guild)
+    print("%d events" % len(events))
+
+    print("\nwait (min):       n      p50      p90      p99")
+    for name, (n, percentiles) in wait_distribution(events, lanes).items():
+        print("  %-10s %6d %8.1f %8.1f %8.1f" % (name, n, *(p / 60 for p in percentiles)))
+
+    print("\nhandler                  sessions  mean (min)  per hour")
+    for handler, (n, mean, rate) in sorted(handler_throughput(events).items(), key=lambda item: -item[1][0]):
+        print("  %-22d %8d %11.1f %9.2f" % (handler, n, mean / 60, rate))
+
+    counts, waits = load_heatmap(events)
+    hours = np.flatnonzero(counts.sum(axis=0))
+    if len(hours):
+        print("\nstudents queued (mean wait in min), by weekday and hour")
+        print("     " + "".join("%9d" % hour for hour in hours))
+        for day, name in enumerate(("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")):
+            print("  %s" % name + "".join(
+                "%9s" % ("%d (%.0f)" % (counts[day, hour], waits[day, hour] / 60) if counts[day, hour] else "-")
+                for hour in hours
+            ))
+
+if __name__ == "__main__":
+    main()
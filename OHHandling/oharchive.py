@@ -0,0 +1,159 @@
+import gzip
+from json import dumps, loads
+from os import makedirs, path
+from threading import Lock
+
+class OHArchiveEntry:
+    __slots__ = ("name", "student_id", "handler_id", "date", "segment", "offset", "length")
+
+    def __init__(self, name: str, student_id: int, handler_id: int, date: str,
+                 segment: int, offset: int, length: int):
+        self.name = name
+        self.student_id = student_id
+        self.handler_id = handler_id
+        self.date = date
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+
+class _GuildArchive:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.entries = []
+        self.by_student = {}
+        self.by_handler = {}
+        self.by_date = {}
+        self.segment = 0
+        self.segment_size = 0
+
+class OHArchive:
+    DIRECTORY = "OHHandling/sessionlogs/archive"
+
+    # start a new segment once the current one is this big, so no single file
+    # grows without bound over a semester
+    MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, directory: str = DIRECTORY):
+        self._directory = directory
+        self._guilds = {}
+        self._lock = Lock()
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: store()
+    :preconditions: Called off the event loop; this compresses and writes to disk.
+    :postconditions: The transcript is compressed and appended to the guild's
+                     current segment, and an entry for it is appended to the
+                     guild's index and returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def store(self, guild_id: int, name: str, student_id: int, handler_id: int,
+              date: str, data: bytes) -> OHArchiveEntry:
+        compressed = gzip.compress(data)
+
+        with self._lock:
+            archive = self._load(guild_id)
+
+            if archive.segment_size and archive.segment_size + len(compressed) > self.MAX_SEGMENT_SIZE:
+                archive.segment += 1
+                archive.segment_size = 0
+
+            # every transcript is its own gzip member, so it can be read back by
+            # seeking straight to it without touching the rest of the segment
+            entry = OHArchiveEntry(name, student_id, handler_id, date,
+                                   archive.segment, archive.segment_size, len(compressed))
+            with open(self._segment_path(archive, entry.segment), 'ab') as segment:
+                segment.write(compressed)
+
+            with open(path.join(archive.directory, "index.jsonl"), 'a') as index:
+                index.write(dumps({
+                    "name": entry.name,
+                    "student": entry.student_id,
+                    "handler": entry.handler_id,
+                    "date": entry.date,
+                    "segment": entry.segment,
+                    "offset": entry.offset,
+                    "length": entry.length
+                }) + "\n")
+
+            archive.segment_size += len(compressed)
+            self._add(archive, entry)
+
+        return entry
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: find()
+    :preconditions: Called off the event loop; the guild's index may be read from
+                    disk, and the archive's lock is shared with the writer thread.
+    :postconditions: The entries of the guild's archived transcripts that match
+                     every given key are returned, oldest first.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def find(self, guild_id: int, student_id: int = None, handler_id: int = None,
+             date: str = None) -> [OHArchiveEntry]:
+        with self._lock:
+            archive = self._load(guild_id)
+
+            # intersect the positions from each index that was asked for, starting
+            # with the smallest, instead of looking at every entry
+            keys = [
+                (archive.by_student, student_id),
+                (archive.by_handler, handler_id),
+                (archive.by_date, date)
+            ]
+            matches = sorted((index.get(key, []) for index, key in keys if key is not None), key=len)
+            if not matches: return list(archive.entries)
+
+            found = set(matches[0])
+            for positions in matches[1:]: found.intersection_update(positions)
+
+            return [archive.entries[i] for i in sorted(found)]
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: read()
+    :preconditions: Called off the event loop; the entry came from this guild's find().
+    :postconditions: The decompressed transcript is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def read(self, guild_id: int, entry: OHArchiveEntry) -> bytes:
+        with self._lock:
+            archive = self._load(guild_id)
+
+        with open(self._segment_path(archive, entry.segment), 'rb') as segment:
+            segment.seek(entry.offset)
+            return gzip.decompress(segment.read(entry.length))
+
+    def _load(self, guild_id: int) -> _GuildArchive:
+        archive = self._guilds.get(guild_id)
+        if archive is not None: return archive
+
+        archive = self._guilds[guild_id] = _GuildArchive(path.join(self._directory, str(guild_id)))
+        makedirs(archive.directory, exist_ok=True)
+
+        # the index is small next to the segments, so it is read once and kept
+        index_path = path.join(archive.directory, "index.jsonl")
+        if path.exists(index_path):
+            with open(index_path) as index:
+                for line in index:
+                    if not line.strip(): continue
+
+                    record = loads(line)
+                    self._add(archive, OHArchiveEntry(
+                        record["name"], record["student"], record["handler"], record["date"],
+                        record["segment"], record["offset"], record["length"]
+                    ))
+
+        # pick up appending where the last segment left off
+        if archive.entries: archive.segment = archive.entries[-1].segment
+        segment_path = self._segment_path(archive, archive.segment)
+        archive.segment_size = path.getsize(segment_path) if path.exists(segment_path) else 0
+
+        return archive
+
+    def _add(self, archive: _GuildArchive, entry: OHArchiveEntry) -> None:
+        position = len(archive.entries)
+        archive.entries.append(entry)
+        archive.by_student.setdefault(entry.student_id, []).append(position)
+        archive.by_handler.setdefault(entry.handler_id, []).append(position)
+        archive.by_date.setdefault(entry.date, []).append(position)
+
+        return
+
+    def _segment_path(self, archive: _GuildArchive, segment: int) -> str:
+        return path.join(archive.directory, "segment-%05d.gz" % segment)
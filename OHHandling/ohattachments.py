@@ -0,0 +1,104 @@
+import aiohttp
+import asyncio
+from hashlib import sha256
+from os import makedirs, path, replace
+from threading import get_ident
+
+class OHAttachmentStore:
+    DIRECTORY = "OHHandling/sessionlogs/attachments"
+
+    # discord's own upload limit without boosts; anything bigger is left as a
+    # link in the transcript rather than downloaded
+    MAX_SIZE = 8 * 1024 * 1024
+
+    # how many downloads run at once, which also bounds how much is held in
+    # memory while they are hashed
+    MAX_CONCURRENCY = 4
+    TIMEOUT = 60
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, directory: str = DIRECTORY, max_size: int = MAX_SIZE,
+                 max_concurrency: int = MAX_CONCURRENCY):
+        self._directory = directory
+        self._max_size = max_size
+        self._limit = asyncio.Semaphore(max_concurrency)
+
+        # one pooled session for every download, created on first use so it
+        # belongs to the bot's running event loop
+        self._session = None
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: fetch_all()
+    :preconditions: Called from within the bot's running event loop. Each attachment
+                    has an "id", a "url" and a "size".
+    :postconditions: Every attachment is downloaded concurrently and stored under the
+                     sha256 of its contents, unless a file with those contents is
+                     already stored. The attachments' ids are returned mapped to their
+                     hashes; those too big or that failed to download are left out.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def fetch_all(self, attachments: [dict]) -> {int: str}:
+        digests = await asyncio.gather(
+                        *(self.fetch(attachment["url"], attachment["size"]) for attachment in attachments),
+                        return_exceptions=True
+                    )
+
+        stored = {}
+        for attachment, digest in zip(attachments, digests):
+            if isinstance(digest, Exception): print("Failed to download <%s>: %s" % (attachment["url"], digest))
+            elif digest is not None: stored[attachment["id"]] = digest
+
+        return stored
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: fetch()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The file at the url is downloaded and stored, and the sha256 of
+                     its contents is returned. None is returned without storing
+                     anything if it is bigger than the size cap.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def fetch(self, url: str, size: int) -> str:
+        # the size discord reports is checked first, and the download itself is
+        # cut off in case it was wrong
+        if size > self._max_size: return None
+
+        async with self._limit:
+            if self._session is None or self._session.closed:
+                self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.TIMEOUT))
+
+            chunks, received = [], 0
+            async with self._session.get(url) as response:
+                response.raise_for_status()
+
+                async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > self._max_size: return None
+                    chunks.append(chunk)
+
+            # hashing and writing happen off the event loop
+            return await asyncio.get_event_loop().run_in_executor(None, self._store, b"".join(chunks))
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: path()
+    :preconditions: OHAttachmentStore has been instantiated.
+    :postconditions: Where the file with the given sha256 is, or would be, stored is
+                     returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def path(self, digest: str) -> str:
+        # fanned out by the first two characters so no directory gets huge
+        return path.join(self._directory, digest[:2], digest)
+
+    def _store(self, data: bytes) -> str:
+        digest = sha256(data).hexdigest()
+        file_path = self.path(digest)
+
+        # the same starter file shared by a whole class is only written once
+        if path.exists(file_path): return digest
+
+        # written to a file of this thread's own and moved into place, so two
+        # downloads of the same file never see half of one another
+        makedirs(path.dirname(file_path), exist_ok=True)
+        part_path = "%s.%d.part" % (file_path, get_ident())
+        with open(part_path, 'wb') as file: file.write(data)
+        replace(part_path, file_path)
+
+        return digest
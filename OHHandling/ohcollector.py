@@ -0,0 +1,143 @@
+import discord
+import re
+from asyncio import gather, Semaphore
+from datetime import datetime, timedelta
+from pathvalidate import sanitize_filename as sanitize
+from pytz import timezone, utc
+from OHHandling.ohroompool import OHRoomPool
+from OHHandling.ohtranscript import OHTranscript, OHTranscriptWriter
+
+class OHOrphans:
+    def __init__(self):
+        # the session roles, categories and channels that no session or pool owns
+        self.roles = []
+        self.categories = []
+        self.channels = []
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: __len__() / __bool__()
+    :preconditions: OHOrphans has been instantiated.
+    :postconditions: The number of orphaned roles and channels is returned, or
+                     whether there are any.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def __len__(self) -> int:
+        return len(self.roles) + len(self.categories) + len(self.channels)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+class OHRoomCollector:
+    # a session room is only collected once it's older than this, so one that is
+    # still being created (and isn't registered anywhere yet) is left alone
+    GRACE = 5 * 60
+
+    # how many deletions are in flight at once; discord.py waits out any 429s
+    MAX_CONCURRENCY = 5
+
+    # the names OHSession and OHRoomPool give everything they create
+    SESSION_PREFIX = "Session for "
+    CHANNEL_NAMES = ("session-text", "Session Voice")
+
+    # the welcome message mentions the student, then the handler
+    MENTION = re.compile(r"<@!?(\d+)>")
+
+    def __init__(self, writer: OHTranscriptWriter, grace: float = GRACE, max_concurrency: int = MAX_CONCURRENCY):
+        self._writer = writer
+        self._grace = timedelta(seconds=grace)
+        self._limit = Semaphore(max_concurrency)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: find()
+    :preconditions: The bot client is in the guild.
+    :postconditions: The guild's session roles, categories and channels whose ids
+                     aren't in live_ids and that are older than the grace period
+                     are returned. Only the guild's cache is scanned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def find(self, guild: discord.Guild, live_ids: {int}) -> OHOrphans:
+        cutoff = datetime.now(utc) - self._grace
+        orphans = OHOrphans()
+
+        def stale(resource) -> bool:
+            created_at = resource.created_at
+            if created_at.tzinfo is None: created_at = utc.localize(created_at)
+
+            return resource.id not in live_ids and created_at < cutoff
+
+        def session_name(name: str) -> bool:
+            return name.startswith(self.SESSION_PREFIX) or name == OHRoomPool.IDLE_NAME
+
+        orphans.roles = [role for role in guild.roles if session_name(role.name) and stale(role)]
+        orphans.categories = [cat for cat in guild.categories if session_name(cat.name) and stale(cat)]
+
+        # only channels inside a session's category are known to be the bot's;
+        # a guild's own channel can have the same name
+        categories = {cat.id for cat in orphans.categories}
+        for channel in guild.channels:
+            if channel.name not in self.CHANNEL_NAMES or not stale(channel): continue
+
+            category = getattr(channel, "category", None)
+            if category is not None and category.id in categories: orphans.channels.append(channel)
+
+        return orphans
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: collect()
+    :preconditions: Called from within the bot's running event loop. The orphans
+                    were found by find().
+    :postconditions: If archive is set, the history of every orphaned session text
+                     channel is archived as a transcript. Every orphan is then
+                     deleted, a few at a time, and the number deleted is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def collect(self, guild: discord.Guild, orphans: OHOrphans, archive: bool = True) -> int:
+        if archive:
+            texts = [channel for channel in orphans.channels if channel.name == self.CHANNEL_NAMES[0]]
+            await gather(*(self._archive(guild, text) for text in texts), return_exceptions=True)
+
+        # channels go before their categories, so nothing is left loose if the
+        # collection is cut short
+        deleted = sum(await gather(*(self._delete(resource) for resource in orphans.channels + orphans.roles)))
+        deleted += sum(await gather(*(self._delete(category) for category in orphans.categories)))
+
+        return deleted
+
+    async def _delete(self, resource) -> int:
+        async with self._limit:
+            try:
+                await resource.delete()
+            except discord.NotFound:
+                return 0
+            except discord.HTTPException as error:
+                print("Failed to delete <%s>: %s" % (resource.name, error))
+                return 0
+
+        return 1
+
+    async def _archive(self, guild: discord.Guild, text: discord.TextChannel) -> None:
+        async with self._limit:
+            messages = [message async for message in text.history(limit=None, oldest_first=True)]
+        if not messages: return
+
+        # the session's handler and student only survive in the welcome message
+        ids = [int(found) for found in self.MENTION.findall(messages[0].content or "")][:2]
+        student_id, handler_id = (ids + [0, 0])[:2]
+
+        category = getattr(text, "category", None)
+        name = category.name[len(self.SESSION_PREFIX):] if category is not None else "unknown"
+        opened_est = messages[0].created_at.astimezone(timezone("EST"))
+
+        # named like OHSession's own logs, so they sort alongside them
+        file_name = "OHHandling/sessionlogs/%s_orphaned_%02d%02d%d_%02d%02d_%d.jsonl" % (
+                        sanitize(name.replace(' ', '_')),
+                        opened_est.month,
+                        opened_est.day,
+                        opened_est.year,
+                        opened_est.hour,
+                        opened_est.minute,
+                        text.id
+                    )
+
+        transcript = OHTranscript(self._writer, file_name, guild.id, student_id, handler_id, opened_est.date().isoformat())
+        for message in messages: await transcript.append(message)
+        await (await transcript.finalize())
+
+        return
@@ -0,0 +1,79 @@
+class OHWaitEstimator:
+    # how much each finished session moves the averages, what to assume before
+    # any session has finished, and the shortest session that counts, so a
+    # session opened and closed by mistake can't make the estimate collapse
+    ALPHA = 0.2
+    DEFAULT_SERVICE = 600.0
+    MIN_SERVICE = 30.0
+
+    def __init__(self):
+        self._mean = None
+        self._handler_means = {}
+        self._on_duty = set()
+
+        # the rate the on duty handlers get through students at, kept up to date
+        # as events come in: handlers with an average of their own add
+        # 1 / their average, and the rest are counted so they can be assumed to
+        # work at the guild's average
+        self._known_rate = 0.0
+        self._unseen = 0
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: observe()
+    :preconditions: One of the guild's sessions was closed.
+    :postconditions: The guild's and the handler's average session lengths are
+                     updated with the session's length.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def observe(self, handler_id: int, seconds: float) -> None:
+        seconds = max(seconds, self.MIN_SERVICE)
+        self._mean = seconds if self._mean is None else self._mean + self.ALPHA * (seconds - self._mean)
+
+        old = self._handler_means.get(handler_id)
+        new = seconds if old is None else old + self.ALPHA * (seconds - old)
+        self._handler_means[handler_id] = new
+
+        if handler_id in self._on_duty:
+            if old is None:
+                self._unseen -= 1
+                self._known_rate += 1 / new
+            else:
+                self._known_rate += 1 / new - 1 / old
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: set_on_duty()
+    :preconditions: The handler went on or off duty in the guild.
+    :postconditions: The handler counts towards the guild's rate only while on duty.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def set_on_duty(self, handler_id: int, on_duty: bool) -> None:
+        if on_duty == (handler_id in self._on_duty): return
+
+        sign = 1 if on_duty else -1
+        if on_duty: self._on_duty.add(handler_id)
+        else: self._on_duty.discard(handler_id)
+
+        mean = self._handler_means.get(handler_id)
+        if mean is None: self._unseen += sign
+        else: self._known_rate += sign / mean
+
+        # don't let rounding errors pile up over a long day of handlers coming
+        # and going
+        if not self._on_duty: self._known_rate, self._unseen = 0.0, 0
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: wait()
+    :preconditions: OHWaitEstimator has been instantiated.
+    :postconditions: The estimated number of seconds until the student at the given
+                     zero-based position is accepted is returned, or None if
+                     nobody is on duty.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def wait(self, position: int) -> float:
+        if not self._on_duty: return None
+
+        rate = self._known_rate + self._unseen / (self._mean or self.DEFAULT_SERVICE)
+        if rate <= 0: return None
+
+        return (position + 1) / rate
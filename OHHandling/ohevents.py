@@ -0,0 +1,73 @@
+import struct
+from datetime import datetime, timezone
+from json import dumps
+from os import makedirs, path
+from time import time
+
+class OHEventLog:
+    DIRECTORY = "OHHandling/events"
+
+    # every state change is one fixed size little-endian record: when, what,
+    # the lane (enqueues only, 0 otherwise), the guild, the student (or the
+    # handler for duty changes) and the handler who acted, if any. ohanalytics
+    # reads the files straight into an array with the same layout
+    RECORD = struct.Struct("<dBBQQQ")
+    MAGIC = b"OHEVENTS1\n"
+
+    ENQUEUE, LEAVE, KICK, ACCEPT, CLOSE, ON_DUTY, OFF_DUTY, EXPIRE = range(1, 9)
+
+    def __init__(self, lanes: [str], directory: str = DIRECTORY):
+        self._directory = directory
+        self._lanes = list(lanes)
+        self._lane_codes = {lane: code for code, lane in enumerate(self._lanes, 1)}
+        self._file = None
+        self._day = None
+
+        makedirs(directory, exist_ok=True)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: record()
+    :preconditions: OHEventLog has been instantiated.
+    :postconditions: The event is appended to the day's log file.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def record(self, kind: int, guild_id: int, member_id: int, actor_id: int = 0, lane: str = None) -> None:
+        now = time()
+
+        try:
+            file = self._open(now)
+            file.write(self.RECORD.pack(now, kind, self._lane_codes.get(lane, 0), guild_id, member_id, actor_id))
+
+            # a record is a handful of bytes, so handing it to the OS right away
+            # costs next to nothing and nothing is lost if the bot is killed
+            file.flush()
+        except OSError as error:
+            print("Failed to record event %d: %s" % (kind, error))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: close()
+    :preconditions: OHEventLog has been instantiated.
+    :postconditions: The current log file is closed.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def close(self) -> None:
+        if self._file is not None: self._file.close()
+        self._file = self._day = None
+
+        return
+
+    def _open(self, now: float):
+        # one file per UTC day, each starting with the lane names its records'
+        # lane codes refer to
+        day = datetime.fromtimestamp(now, timezone.utc).strftime("%Y%m%d")
+        if day == self._day: return self._file
+
+        self.close()
+        file_name = path.join(self._directory, "events-%s.bin" % day)
+        new = not path.exists(file_name) or path.getsize(file_name) == 0
+
+        self._file = open(file_name, 'ab')
+        self._day = day
+        if new: self._file.write(self.MAGIC + dumps(self._lanes).encode() + b"\n")
+
+        return self._file
@@ -1,22 +1,46 @@
 import discord
-from discord.utils import get as duget
 from functools import wraps
+from time import perf_counter
 
 class AlreadyOnDuty(Exception): pass
 class BadPosition(Exception): pass
 class CommandInDM(Exception): pass
 class ExistsInQueue(Exception): pass
 class NoQueueReason(Exception): pass
+class NoSessionLogs(Exception): pass
 class NotInQueue(Exception): pass
 class NotOnDuty(Exception): pass
 class InSession(Exception): pass
 class OfficeHoursClosed(Exception): pass
 class QueueIsEmpty(Exception): pass
+class StudentLeft(Exception): pass
+class UnknownLane(Exception): pass
 
 def office_hours_exceptions():
     def decorator(fxn):
+        name = "command.%s" % fxn.__name__.strip('_')
+
         @wraps(fxn)
         async def inner(*args):
+            # every command passes through here exactly once, so this is where
+            # its latency (including the checks and the error reply) is recorded
+            started = perf_counter()
+            error = None
+
+            try:
+                return await handle(*args)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                metrics = getattr(args[0], "_metrics", None)
+                guild = getattr(args[1], "guild", None)
+
+                if metrics is not None:
+                    metrics.observe(name, perf_counter() - started, guild.id if guild is not None else None)
+                    if error is not None: metrics.count("error.%s" % type(error).__name__)
+
+        async def handle(*args):
             try:
                 return await fxn(*args)
             except ExistsInQueue:  # l3
@@ -27,6 +51,10 @@ def office_hours_exceptions():
                 return await args[1].send("You need a reason to queue.")
             except NotInQueue:  # l3
                 return await args[1].send("You aren't queued.")
+            except NoSessionLogs:  # l3
+                return await args[1].send("No session logs found.")
+            except UnknownLane as e:  # l3
+                return await args[1].send("There's no such lane. The lanes are: %s." % e)
             except NotOnDuty:  # l2
                 return await args[1].send("You aren't on duty.")
             except AlreadyOnDuty:  # l2
@@ -37,15 +65,20 @@ def office_hours_exceptions():
                 return await args[1].send("Office hours are closed.")
             except QueueIsEmpty:  # l2
                 return await args[1].send("The queue is currently empty.")
+            except StudentLeft as e:  # l2
+                return await args[1].send("%s has left the server, so they were taken out of the queue." % e)
             except CommandInDM: pass  # l1
 
         return inner
     return decorator
 
+# each guard below wraps its command in office_hours_exceptions() last, over
+# wraps(), so the command's latency is recorded under its own name rather than
+# "inner"
 def enqueue():
     def decorator(fxn):
-        @wraps(fxn)
         @office_hours_exceptions()
+        @wraps(fxn)
         async def inner(*args):
             # make sure this isn't in a DM channel
             if args[1].message.channel is discord.DMChannel: raise CommandInDM
@@ -63,9 +96,8 @@ def enqueue():
 
             # don't execute the function if the author is already in a session in
             # this guild
-            for session in args[0]._open_sessions[args[1].guild.id]:
-                if session.get_members()["student"] == args[1].author:
-                    raise InSession
+            if args[0]._open_sessions[args[1].guild.id].by_student(args[1].author.id) is not None:
+                raise InSession
 
             return await fxn(*args)
         return inner
@@ -73,8 +105,8 @@ def enqueue():
 
 def kick():
     def decorator(fxn):
-        @wraps(fxn)
         @office_hours_exceptions()
+        @wraps(fxn)
         async def inner(*args):
             # make sure this isn't in a DM channel
             if args[1].message.channel is discord.DMChannel: raise CommandInDM
@@ -89,8 +121,8 @@ def kick():
 
 def dequeue():
     def decorator(fxn):
-        @wraps(fxn)
         @office_hours_exceptions()
+        @wraps(fxn)
         async def inner(*args):
             # make sure this channel isn't in a DM channel
             if args[1].message.channel is discord.DMChannel: raise CommandInDM
@@ -105,8 +137,8 @@ def dequeue():
 
 def accept():
     def decorator(fxn):
-        @wraps(fxn)
         @office_hours_exceptions()
+        @wraps(fxn)
         async def inner(*args):
             # make sure this isn't in a DM channel
             if args[1].message.channel is discord.DMChannel: raise CommandInDM
@@ -115,15 +147,17 @@ def accept():
             if args[0]._handlers_on_duty[args[1].guild.id].get(args[1].author.id) is None:
                 raise NotOnDuty
 
-            # don't execute the function if the queue for this guild is empty
-            if args[0]._queues[args[1].guild.id].is_empty():
+            # don't execute the function if the queue for this guild, or the lane
+            # the author asked for, is empty
+            queue = args[0]._queues[args[1].guild.id]
+            lane = queue.check_lane(args[2]) if len(args) > 2 and args[2] is not None else None
+            if queue.is_empty(lane):
                 raise QueueIsEmpty
 
             # don't execute the function if the author is already handling a session
             # in this guild
-            for session in args[0]._open_sessions[args[1].guild.id]:
-                if session.get_members()["handler"] == args[1].author:
-                    raise InSession
+            if args[0]._open_sessions[args[1].guild.id].by_handler(args[1].author.id) is not None:
+                raise InSession
 
             return await fxn(*args)
         return inner
@@ -131,8 +165,8 @@ def accept():
 
 def close():
     def decorator(fxn):
-        @wraps(fxn)
         @office_hours_exceptions()
+        @wraps(fxn)
         async def inner(*args):
             # make sure this isn't in a DM channel
             if args[1].message.channel is discord.DMChannel: raise CommandInDM
@@ -147,14 +181,14 @@ def close():
 
 def on_duty():
     def decorator(fxn):
-        @wraps(fxn)
         @office_hours_exceptions()
+        @wraps(fxn)
         async def inner(*args):
             # make sure this isn't in a DM channel
             if args[1].message.channel is discord.DMChannel: raise CommandInDM
 
             # don't continue if the author is already on duty in this guild
-            duty_role = duget(args[1].guild.roles, name="On Duty")
+            duty_role = args[0]._resources.role(args[1].guild, "On Duty")
             if duty_role in args[1].author.roles: raise AlreadyOnDuty
 
             return await fxn(*args)
@@ -163,20 +197,18 @@ def on_duty():
 
 def off_duty():
     def decorator(fxn):
-        @wraps(fxn)
         @office_hours_exceptions()
+        @wraps(fxn)
         async def inner(*args):
             # make sure this isn't in a DM channel
             if args[1].message.channel is discord.DMChannel: raise CommandInDM
 
             # prevent the author from going off duty if they're handling a session
-            for session in args[0]._open_sessions[args[1].guild.id]:
-                if session.get_members()["handler"] == args[1].author:
-                    raise InSession
+            if args[0]._open_sessions[args[1].guild.id].by_handler(args[1].author.id) is not None:
+                raise InSession
 
             # don't continue if the author is not on duty in this guild
-            #duty_role = duget(args[1].guild.roles, name="On Duty")
-            if duget(args[1].guild.roles, name="On Duty") not in args[1].author.roles:
+            if args[0]._resources.role(args[1].guild, "On Duty") not in args[1].author.roles:
                 raise NotOnDuty
 
             return await fxn(*args)
@@ -0,0 +1,17 @@
+class OHGuildDict(dict):
+    def __init__(self, init):
+        # init is called with the id of a guild that hasn't been used yet and
+        # fills in its state, here and in every other OHGuildDict that shares it
+        super().__init__()
+        self._init = init
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: __missing__()
+    :preconditions: The guild's state is looked up with [] before it was created.
+    :postconditions: The guild's state is created and returned. get(), in and
+                     iterating never create anything.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def __missing__(self, guild_id: int):
+        self._init(guild_id)
+
+        return dict.__getitem__(self, guild_id)
@@ -0,0 +1,235 @@
+from bisect import bisect_left, bisect_right
+
+class OHIndexedQueue:
+    def __init__(self):
+        # every appended item gets a slot; removed items leave a None behind so
+        # that the slots of the items after it (and the ids pointing at them)
+        # don't have to move. Each slot also keeps the order it was appended
+        # with, which never decreases, so the slots can be binary searched
+        self._slots = []
+        self._orders = []
+        self._index = {}
+        self._head = 0
+        self._size = 0
+
+        # a Fenwick tree over the slots, holding a 1 for every live slot, lets
+        # us turn a slot into a position (and back) in O(log n)
+        self._capacity = 0
+        self._tree = [0]
+        self._rebuild()
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: append()
+    :preconditions: The key is not already present in the queue, and the order is
+                    greater than that of every item appended before it.
+    :postconditions: The item is placed at the back of the queue and can be
+                     looked up by its key.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def append(self, key: int, item, order) -> None:
+        if key in self._index: raise KeyError(key)
+        if self._orders and order <= self._orders[-1]: raise ValueError(order)
+
+        # out of room in the tree, so compact the dead slots and grow it
+        if len(self._slots) == self._capacity: self._rebuild()
+
+        slot = len(self._slots)
+        self._slots.append((key, item))
+        self._orders.append(order)
+        self._index[key] = slot
+        self._add(slot, 1)
+        self._size += 1
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: popleft()
+    :preconditions: The queue is not empty.
+    :postconditions: The item at the front of the queue is removed and returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def popleft(self):
+        if self._size == 0: raise IndexError("pop from an empty queue")
+
+        # skip past anything that was removed from the front already; every
+        # slot is only ever skipped once, so this is amortized O(1)
+        while self._slots[self._head] is None: self._head += 1
+
+        key, item = self._slots[self._head]
+        self._discard(key)
+
+        return item
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: remove()
+    :preconditions: The key is present in the queue.
+    :postconditions: The item with the given key is removed from the queue and
+                     returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def remove(self, key: int):
+        if key not in self._index: raise KeyError(key)
+
+        item = self._slots[self._index[key]][1]
+        self._discard(key)
+
+        return item
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: position()
+    :preconditions: The key is present in the queue.
+    :postconditions: The zero-based position of the key's item in the queue
+                     is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def position(self, key: int) -> int:
+        return self._prefix(self._index[key])
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: at()
+    :preconditions: 0 <= position < len(queue).
+    :postconditions: The item at the zero-based position is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def at(self, position: int):
+        if not 0 <= position < self._size: raise IndexError(position)
+
+        return self._slots[self._find(position)][1]
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: first_key()
+    :preconditions: OHIndexedQueue has been instantiated.
+    :postconditions: The key of the item at the front of the queue is returned, or
+                     None if the queue is empty.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def first_key(self) -> int:
+        if self._size == 0: return None
+
+        while self._slots[self._head] is None: self._head += 1
+
+        return self._slots[self._head][0]
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: order()
+    :preconditions: The key is present in the queue.
+    :postconditions: The order the key's item was appended with is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def order(self, key: int):
+        return self._orders[self._index[key]]
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: rank()
+    :preconditions: OHIndexedQueue has been instantiated.
+    :postconditions: The number of queued items appended with a lower order than
+                     the given one is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def rank(self, order) -> int:
+        return self._prefix(bisect_left(self._orders, order, self._head))
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: get()
+    :preconditions: OHIndexedQueue has been instantiated.
+    :postconditions: The item stored under the key is returned, or default if
+                     the key isn't queued.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def get(self, key: int, default=None):
+        slot = self._index.get(key)
+
+        return default if slot is None else self._slots[slot][1]
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: iter_from()
+    :preconditions: OHIndexedQueue has been instantiated.
+    :postconditions: (position, item) pairs are yielded in queue order, starting
+                     at the given zero-based position.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def iter_from(self, position: int = 0):
+        if position >= self._size: return
+
+        slot = self._head if position <= 0 else self._find(position)
+        position = max(position, 0)
+
+        for entry in self._slots[slot:]:
+            if entry is None: continue
+
+            yield position, entry[1]
+            position += 1
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: iter_after()
+    :preconditions: OHIndexedQueue has been instantiated.
+    :postconditions: (order, item) pairs are yielded in queue order for every item
+                     appended with a higher order than the given one, or for
+                     every item if no order is given.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def iter_after(self, order=None):
+        slot = self._head if order is None else max(bisect_right(self._orders, order), self._head)
+
+        for i in range(slot, len(self._slots)):
+            entry = self._slots[i]
+            if entry is not None: yield self._orders[i], entry[1]
+
+    def __iter__(self):
+        for _, item in self.iter_from(0): yield item
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._index
+
+    def _discard(self, key: int) -> None:
+        slot = self._index.pop(key)
+        self._slots[slot] = None
+        self._add(slot, -1)
+        self._size -= 1
+
+        # once most of the slots are dead, renumber the live ones so memory and
+        # the tree's depth follow the queue's actual size
+        if len(self._slots) - self._size > max(self._size, 32): self._rebuild()
+
+        return
+
+    def _rebuild(self) -> None:
+        live = [i for i in range(self._head, len(self._slots)) if self._slots[i] is not None]
+        self._orders = [self._orders[i] for i in live]
+        live = [self._slots[i] for i in live]
+
+        self._slots = live
+        self._index = {key: slot for slot, (key, _) in enumerate(live)}
+        self._head = 0
+
+        # keep the capacity a power of two with room to grow so that _find()
+        # can walk the tree bit by bit
+        self._capacity = 16
+        while self._capacity < 2 * len(live): self._capacity *= 2
+
+        # build the tree in O(n) by pushing each node's count into its parent
+        self._tree = [0] * (self._capacity + 1)
+        for i in range(1, len(live) + 1): self._tree[i] += 1
+        for i in range(1, self._capacity + 1):
+            parent = i + (i & -i)
+            if parent <= self._capacity: self._tree[parent] += self._tree[i]
+
+        return
+
+    def _add(self, slot: int, delta: int) -> None:
+        i = slot + 1
+        while i <= self._capacity:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, slot: int) -> int:
+        # number of live slots strictly before the given one
+        total, i = 0, slot
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+
+        return total
+
+    def _find(self, position: int) -> int:
+        # walk down the tree to the slot holding the (position + 1)th live item
+        slot, remaining, step = 0, position + 1, self._capacity
+        while step:
+            if slot + step <= self._capacity and self._tree[slot + step] < remaining:
+                slot += step
+                remaining -= self._tree[slot]
+            step //= 2
+
+        return slot
@@ -0,0 +1,159 @@
+from heapq import merge
+from itertools import count, islice
+from OHHandling.ohindexedqueue import OHIndexedQueue
+
+class OHLaneQueue:
+    def __init__(self, lanes: {str: float}, aging: float):
+        # every lane is its own FIFO. An item is due aging / weight seconds after
+        # it was queued, and the lanes are merged by due time, so a heavier lane
+        # gets ahead of a lighter one but anyone who has waited long enough
+        # reaches the front regardless of their lane
+        self._lanes = {lane: OHIndexedQueue() for lane in lanes}
+        self._delay = {lane: aging / weight for lane, weight in lanes.items()}
+        self._last_due = {lane: float("-inf") for lane in lanes}
+        self._lane_of = {}
+
+        # breaks ties between items due at the same time
+        self._seq = count()
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: append()
+    :preconditions: The key is not already present in any lane.
+    :postconditions: The item is placed at the back of its lane and is ordered
+                     among the other lanes by when it is due.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def append(self, key: int, item, lane: str, enqueued_at: float) -> None:
+        if key in self._lane_of: raise KeyError(key)
+
+        # a clock that steps backwards mustn't put anyone ahead of someone who
+        # queued before them in the same lane
+        due = max(enqueued_at + self._delay[lane], self._last_due[lane])
+        self._last_due[lane] = due
+
+        self._lanes[lane].append(key, item, (due, next(self._seq)))
+        self._lane_of[key] = lane
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: remove()
+    :preconditions: The key is present in a lane.
+    :postconditions: The key's item is removed from its lane and returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def remove(self, key: int):
+        return self._lanes[self._lane_of.pop(key)].remove(key)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: clear()
+    :preconditions: OHLaneQueue has been instantiated.
+    :postconditions: Every lane is emptied, and the items that were queued are
+                     returned in the order they were due.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def clear(self) -> list:
+        items = list(self.iter_after())
+
+        self._lanes = {lane: OHIndexedQueue() for lane in self._lanes}
+        self._lane_of = {}
+
+        return items
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: first_key()
+    :preconditions: OHLaneQueue has been instantiated.
+    :postconditions: The key of the item due first, in the given lane or in any
+                     lane, is returned, or None if there isn't one.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def first_key(self, lane: str = None) -> int:
+        if lane is not None: return self._lanes[lane].first_key()
+
+        first = None
+        for queue in self._lanes.values():
+            key = queue.first_key()
+            if key is not None and (first is None or queue.order(key) < first[0]):
+                first = (queue.order(key), key)
+
+        return first[1] if first is not None else None
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: position()
+    :preconditions: The key is present in a lane.
+    :postconditions: The key's zero-based position across every lane is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def position(self, key: int) -> int:
+        order = self.order(key)
+
+        # a binary search per lane rather than a walk over the whole queue
+        return sum(queue.rank(order) for queue in self._lanes.values())
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: position_if()
+    :preconditions: The lane exists.
+    :postconditions: The zero-based position an item appended to the lane at the
+                     given time would get is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def position_if(self, lane: str, enqueued_at: float) -> int:
+        due = max(enqueued_at + self._delay[lane], self._last_due[lane])
+
+        # it would go behind everything due at the same time
+        return sum(queue.rank((due, float("inf"))) for queue in self._lanes.values())
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: order() / lane()
+    :preconditions: The key is present in a lane.
+    :postconditions: The key's (due time, sequence) order, or its lane, is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def order(self, key: int) -> tuple:
+        return self._lanes[self._lane_of[key]].order(key)
+
+    def lane(self, key: int) -> str:
+        return self._lane_of[key]
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: at()
+    :preconditions: 0 <= position < len(queue).
+    :postconditions: The item at the zero-based position across every lane is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def at(self, position: int):
+        if not 0 <= position < len(self): raise IndexError(position)
+
+        return next(islice(self.iter_after(), position, None))
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: iter_after()
+    :preconditions: OHLaneQueue has been instantiated.
+    :postconditions: Items are yielded in the order they are due across every lane,
+                     starting after the given order, or from the front if no order
+                     is given.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def iter_after(self, order: tuple = None):
+        lanes = (queue.iter_after(order) for queue in self._lanes.values())
+
+        for _, item in merge(*lanes, key=lambda pair: pair[0]): yield item
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: get()
+    :preconditions: OHLaneQueue has been instantiated.
+    :postconditions: The item stored under the key is returned, or default if the
+                     key isn't queued.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def get(self, key: int, default=None):
+        lane = self._lane_of.get(key)
+
+        return default if lane is None else self._lanes[lane].get(key, default)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: lane_len()
+    :preconditions: The lane exists.
+    :postconditions: The number of items queued in the lane is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def lane_len(self, lane: str) -> int:
+        return len(self._lanes[lane])
+
+    def __iter__(self):
+        return self.iter_after()
+
+    def __len__(self) -> int:
+        return len(self._lane_of)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._lane_of
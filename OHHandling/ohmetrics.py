@@ -0,0 +1,176 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from os import replace
+from time import perf_counter
+
+class _Histogram:
+    # bucket bounds grow by 20% from 0.1ms to ~2 minutes, which keeps any
+    # percentile within 20% of the truth in a fixed, small amount of memory
+    BOUNDS = [0.0001 * 1.2 ** i for i in range(78)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0: return 0.0
+
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank: return self.BOUNDS[min(i, len(self.BOUNDS) - 1)]
+
+        return self.BOUNDS[-1]
+
+class OHMetrics:
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._guild_counters = {}
+        self._rest_calls = {}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: observe()
+    :preconditions: OHMetrics has been instantiated.
+    :postconditions: The latency is added to the named histogram, and the name is
+                     counted for the guild if one is given.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def observe(self, name: str, seconds: float, guild_id: int = None) -> None:
+        histogram = self._histograms.get(name)
+        if histogram is None: histogram = self._histograms[name] = _Histogram()
+        histogram.observe(seconds)
+
+        if guild_id is not None: self.count(name, guild_id)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: count()
+    :preconditions: OHMetrics has been instantiated.
+    :postconditions: The named counter, and the guild's copy of it if a guild is
+                     given, is increased.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def count(self, name: str, guild_id: int = None, n: int = 1) -> None:
+        self._counters[name] = self._counters.get(name, 0) + n
+
+        if guild_id is not None:
+            counters = self._guild_counters.setdefault(guild_id, {})
+            counters[name] = counters.get(name, 0) + n
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: timer()
+    :preconditions: OHMetrics has been instantiated.
+    :postconditions: The time spent inside the with block is observed under the name.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @contextmanager
+    def timer(self, name: str, guild_id: int = None):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - started, guild_id)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: instrument_http()
+    :preconditions: The discord.http.HTTPClient hasn't been instrumented yet.
+    :postconditions: Every REST call the client makes is counted and timed by route.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def instrument_http(self, http) -> None:
+        request = http.request
+
+        @wraps(request)
+        async def counted(route, **kwargs):
+            key = "%s %s" % (route.method, route.path)
+            self._rest_calls[key] = self._rest_calls.get(key, 0) + 1
+
+            with self.timer("rest"):
+                return await request(route, **kwargs)
+
+        http.request = counted
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: summary()
+    :preconditions: OHMetrics has been instantiated.
+    :postconditions: The percentiles and count of every histogram whose name starts
+                     with the prefix are returned, slowest p95 first.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def summary(self, prefix: str = "") -> [(str, [float], int)]:
+        rows = [
+            (name, [histogram.percentile(q) for q in self.QUANTILES], histogram.count)
+            for name, histogram in self._histograms.items() if name.startswith(prefix)
+        ]
+
+        return sorted(rows, key=lambda row: row[1][1], reverse=True)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: guild_counters()
+    :preconditions: OHMetrics has been instantiated.
+    :postconditions: The guild's counters are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def guild_counters(self, guild_id: int) -> {str: int}:
+        return dict(self._guild_counters.get(guild_id, {}))
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: rest_calls()
+    :preconditions: OHMetrics has been instantiated.
+    :postconditions: The number of REST calls made on each route is returned, most
+                     called first.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def rest_calls(self) -> [(str, int)]:
+        return sorted(self._rest_calls.items(), key=lambda item: item[1], reverse=True)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: prometheus()
+    :preconditions: OHMetrics has been instantiated.
+    :postconditions: Every metric is returned in the Prometheus text exposition format.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def prometheus(self) -> str:
+        escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"')
+        lines = ["# TYPE oh_latency_seconds summary"]
+
+        for name, histogram in sorted(self._histograms.items()):
+            for q in self.QUANTILES:
+                lines.append('oh_latency_seconds{name="%s",quantile="%s"} %.6f' % (escape(name), q, histogram.percentile(q)))
+            lines.append('oh_latency_seconds_sum{name="%s"} %.6f' % (escape(name), histogram.sum))
+            lines.append('oh_latency_seconds_count{name="%s"} %d' % (escape(name), histogram.count))
+
+        lines.append("# TYPE oh_events_total counter")
+        for name, n in sorted(self._counters.items()):
+            lines.append('oh_events_total{name="%s"} %d' % (escape(name), n))
+        lines.append("# TYPE oh_guild_events_total counter")
+        for guild_id, counters in sorted(self._guild_counters.items()):
+            for name, n in sorted(counters.items()):
+                lines.append('oh_guild_events_total{guild="%d",name="%s"} %d' % (guild_id, escape(name), n))
+
+        lines.append("# TYPE oh_rest_calls_total counter")
+        for route, n in sorted(self._rest_calls.items()):
+            lines.append('oh_rest_calls_total{route="%s"} %d' % (escape(route), n))
+
+        return "\n".join(lines) + "\n"
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: dump()
+    :preconditions: Called off the event loop; this writes to disk.
+    :postconditions: The Prometheus text replaces the file's contents in one step,
+                     so a scraper never reads half a dump.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def dump(self, file_name: str, text: str) -> None:
+        with open(file_name + ".tmp", 'w') as file:
+            file.write(text)
+
+        replace(file_name + ".tmp", file_name)
+
+        return
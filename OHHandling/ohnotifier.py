@@ -0,0 +1,321 @@
+import asyncio
+import discord
+from itertools import count
+from time import monotonic
+
+class _TokenBucket:
+    def __init__(self, rate: int, per: float):
+        self._rate = rate
+        self._per = per
+        self._tokens = float(rate)
+        self._updated = monotonic()
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: acquire()
+    :preconditions: _TokenBucket has been instantiated.
+    :postconditions: One token is taken from the bucket, waiting for it to
+                     refill if it is empty.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) * self._per / self._rate)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: is_full()
+    :preconditions: _TokenBucket has been instantiated.
+    :postconditions: A boolean that indicates if the bucket has refilled
+                     completely (and can be forgotten) is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def is_full(self) -> bool:
+        self._refill()
+
+        return self._tokens >= self._rate
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self._rate, self._tokens + (now - self._updated) * self._rate / self._per)
+        self._updated = now
+
+class OHRecipient:
+    __slots__ = ("id", "_bot")
+
+    def __init__(self, bot, user_id: int):
+        # stands in for a user the notifier only needs to look up when it
+        # actually sends to them
+        self.id = user_id
+        self._bot = bot
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: send()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The user is looked up, from the cache if possible, and sent
+                     the message.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def send(self, content: str) -> None:
+        user = self._bot.get_user(self.id)
+        if user is None: user = await self._bot.fetch_user(self.id)
+
+        await user.send(content)
+
+        return
+
+class OHNotifier:
+    # discord allows roughly 50 requests a second globally and 5 messages every
+    # 5 seconds to a single DM channel; stay slightly under both
+    GLOBAL_RATE = (45, 1.0)
+    ROUTE_RATE = (5, 5.0)
+    MAX_CONCURRENCY = 10
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY):
+        # messages waiting to be sent, by recipient and then by key, each in the
+        # order they were scheduled
+        self._pending = {}
+        self._unique = count()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = {}
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._global_bucket = _TokenBucket(*self.GLOBAL_RATE)
+        self._route_buckets = {}
+
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: notify()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The message is scheduled to be sent to the recipient in the
+                     background. If a message with the same key is still waiting
+                     to be sent to that recipient, it is replaced by this one.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def notify(self, recipient: discord.abc.Messageable, content: str, key: str = None) -> None:
+        # unkeyed messages are never coalesced, so give each of them its own key
+        if key is None: key = next(self._unique)
+
+        pending = self._pending.setdefault(recipient.id, {})
+        if key in pending: self.coalesced += 1
+        pending[key] = (recipient, content)
+
+        # every recipient is sent to by their own worker, so one with a long
+        # backlog (or a slow DM channel) never holds up anyone else's messages
+        self._idle.clear()
+        if recipient.id not in self._workers:
+            self._workers[recipient.id] = asyncio.ensure_future(self._run(recipient.id))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: discard()
+    :preconditions: OHNotifier has been instantiated.
+    :postconditions: A message with the given key that hasn't been sent to the
+                     recipient yet is dropped.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def discard(self, recipient_id: int, key: str) -> None:
+        pending = self._pending.get(recipient_id)
+        if pending is not None: pending.pop(key, None)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: drain()
+    :preconditions: OHNotifier has been instantiated.
+    :postconditions: Returns once every scheduled message has been sent.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def drain(self) -> None:
+        await self._idle.wait()
+
+        return
+
+    async def _run(self, recipient_id: int) -> None:
+        # messages to one recipient stay in order and within discord's per
+        # channel limit
+        bucket = self._route_buckets.get(recipient_id)
+        if bucket is None: bucket = self._route_buckets[recipient_id] = _TokenBucket(*self.ROUTE_RATE)
+
+        try:
+            while self._pending.get(recipient_id):
+                pending = self._pending[recipient_id]
+                recipient, content = pending.pop(next(iter(pending)))
+
+                await bucket.acquire()
+                await self._global_bucket.acquire()
+                await self._deliver(recipient, content)
+        finally:
+            # a message scheduled while the last one was being sent is picked
+            # up by the loop above, so nothing is left behind here
+            self._pending.pop(recipient_id, None)
+            del self._workers[recipient_id]
+            if not self._workers: self._idle.set()
+
+            # forget about the buckets of recipients that have gone quiet
+            for quiet in [r for r, b in self._route_buckets.items() if r not in self._workers and b.is_full()]:
+                del self._route_buckets[quiet]
+
+        return
+
+    async def _deliver(self, recipient: discord.abc.Messageable, content: str) -> None:
+        async with self._limit:
+            try:
+                await recipient.send(content)
+                self.sent += 1
+
+            # a student with closed DMs (or a failed request) shouldn't stop
+            # everyone else's notifications from going out
+            except discord.HTTPException:
+                self.failed += 1
+
+        return
+
+class OHDebouncer:
+    # how long position changes are collected before the latest one is sent
+    WINDOW = 5.0
+
+    def __init__(self, notifier: OHNotifier, key: str, window: float = WINDOW):
+        self._notifier = notifier
+        self._key = key
+        self._window = window
+        self._latest = {}
+        self._timer = None
+
+        self.forwarded = 0
+        self.suppressed = 0
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: notify()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The message replaces any message to the recipient collected
+                     during the current window, and is handed to the notifier
+                     when the window ends.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def notify(self, recipient: discord.abc.Messageable, content: str) -> None:
+        if self._window <= 0:
+            self.forwarded += 1
+            return self._notifier.notify(recipient, content, key=self._key)
+
+        if recipient.id in self._latest: self.suppressed += 1
+        self._latest[recipient.id] = (recipient, content)
+
+        # the window starts with the first change after a flush, so a steady
+        # stream of changes still produces one message per window
+        if self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self._window, self._flush)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: discard()
+    :preconditions: OHDebouncer has been instantiated.
+    :postconditions: Any message to the recipient that hasn't been sent yet is
+                     dropped.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def discard(self, recipient_id: int) -> None:
+        self._latest.pop(recipient_id, None)
+        self._notifier.discard(recipient_id, self._key)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: set_window()
+    :preconditions: OHDebouncer has been instantiated.
+    :postconditions: Changes collected from now on are held for the given
+                     number of seconds; 0 sends every change straight away.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def set_window(self, window: float) -> None:
+        self._window = window
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: get_stats()
+    :preconditions: OHDebouncer has been instantiated.
+    :postconditions: The number of messages handed to the notifier and the
+                     number that were collapsed into a later message are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def get_stats(self) -> {str: int, str: int}:
+        return {"forwarded": self.forwarded, "suppressed": self.suppressed}
+
+    def _flush(self) -> None:
+        self._timer = None
+        latest, self._latest = self._latest, {}
+
+        for recipient, content in latest.values():
+            self._notifier.notify(recipient, content, key=self._key)
+
+        self.forwarded += len(latest)
+
+        return
+
+class OHDigest:
+    # discord rejects messages over 2000 characters; leave room for the header
+    MAX_LENGTH = 1900
+
+    def __init__(self, notifier: OHNotifier, title: str, windows: {int: float}):
+        # windows maps a recipient's id to how many seconds their messages are
+        # collected for; anyone not in it gets every message straight away. It
+        # is shared between guilds, so a handler's choice applies everywhere
+        self._notifier = notifier
+        self._title = title
+        self._windows = windows
+        self._lines = {}
+        self._timers = {}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: notify()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The message is handed to the notifier, or, if the recipient
+                     wants digests, collected into the one they are sent when
+                     their window ends.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def notify(self, recipient: discord.abc.Messageable, content: str) -> None:
+        window = self._windows.get(recipient.id, 0)
+        if window <= 0: return self._notifier.notify(recipient, content)
+
+        self._lines.setdefault(recipient.id, (recipient, []))[1].append(content)
+        if recipient.id not in self._timers:
+            self._timers[recipient.id] = asyncio.get_event_loop().call_later(window, self.flush, recipient.id)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: flush()
+    :preconditions: OHDigest has been instantiated.
+    :postconditions: Anything collected for the recipient is handed to the notifier
+                     as one message now.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def flush(self, recipient_id: int) -> None:
+        timer = self._timers.pop(recipient_id, None)
+        if timer is not None: timer.cancel()
+
+        pending = self._lines.pop(recipient_id, None)
+        if pending is None: return
+
+        recipient, lines = pending
+        if len(lines) == 1: return self._notifier.notify(recipient, lines[0])
+
+        # list as many as fit, oldest first, and count the rest
+        summary, length = [], len(self._title)
+        for line in lines:
+            length += len(line) + 3
+            if length > self.MAX_LENGTH: break
+            summary.append("- " + line)
+        if len(summary) < len(lines): summary.append("...and %d more." % (len(lines) - len(summary)))
+
+        self._notifier.notify(recipient, "%s (%d updates):\n%s" % (self._title, len(lines), "\n".join(summary)))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: stop()
+    :preconditions: OHDigest has been instantiated.
+    :postconditions: Every collected message is sent now.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def stop(self) -> None:
+        for recipient_id in list(self._lines): self.flush(recipient_id)
+
+        return
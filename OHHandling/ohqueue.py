@@ -1,110 +1,171 @@
 import discord
 import OHHandling.ohexceptions as exceptions
-from asyncio import sleep as asy_sleep
+from time import time
+from OHHandling.ohestimator import OHWaitEstimator
+from OHHandling.ohlanequeue import OHLaneQueue
+from OHHandling.ohnotifier import OHNotifier, OHDebouncer, OHRecipient
+from OHHandling.ohqueueentry import OHQueueEntry
+from OHHandling.ohstore import OHStore
 
 class OHQueue:
-    def __init__(self, bot):
+    # students pick a lane when they queue. A student is due AGING / weight
+    # seconds after queueing, and whoever is due first is accepted first, so a
+    # quick question jumps ahead of a debugging session queued at the same time,
+    # but only by a few minutes
+    LANES = {"quick": 4.0, "general": 2.0, "debugging": 1.0, "grades": 0.5}
+    DEFAULT_LANE = "general"
+    AGING = 600.0
+
+    # how long the queue is kept once the last handler goes off duty, in case
+    # another one comes back on
+    EXPIRY = 60 * 15
+
+    # students per page of the queue embed, which keeps a page far below
+    # discord's 4096 character limit on an embed's description
+    PAGE_SIZE = 20
+
+    def __init__(self, bot, notifier: OHNotifier, store: OHStore, guild_id: int,
+                 window: float = OHDebouncer.WINDOW):
         self._bot = bot
-        self._queue = []
+        self._store = store
+        self._guild_id = guild_id
+        self._notifier = notifier
+        self._positions = OHDebouncer(notifier, "position", window)
+        self._queue = OHLaneQueue(self.LANES, self.AGING)
+        self._estimator = OHWaitEstimator()
         self._accepting = False
 
+        # the rendered pages of the queue embed, dropped whenever the queue or
+        # its estimates change, and whoever wants to hear about those changes
+        self._pages = None
+        self._watchers = []
+
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: enqueue()
     :preconditions: At least one handler is on duty in the guild this is called in.
-    :postconditions: A discord.Member instance is added to a guild's queue if
-                     the member isn't already in the queue.
+    :postconditions: An OHQueueEntry for the discord.Member instance is added to the
+                     given lane of a guild's queue if the member isn't already in
+                     the queue.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    async def enqueue(self, student: discord.Member) -> None:
+    async def enqueue(self, student: discord.Member, reason: str = "", lane: str = DEFAULT_LANE) -> None:
         # if the student is already queued in the guild, raise exception
-        if student in self._queue: raise exceptions.ExistsInQueue
+        if student.id in self._queue: raise exceptions.ExistsInQueue
+
+        enqueued_at = time()
+        entry = OHQueueEntry(student.id, student.display_name, reason, enqueued_at, lane)
+        self._queue.append(student.id, entry, lane, enqueued_at)
+        self._store.enqueue(self._guild_id, student.id, reason, enqueued_at, lane)
 
-        self._queue.append(student)
-        await student.send("Successfully entered queue at position %d!" % len(self._queue))
+        # a student in a heavier lane can land ahead of others, who move back
+        position = self._queue.position(student.id)
+        self._notifier.notify(student, "Successfully entered queue at position %d! Estimated wait: %s." % (
+                position + 1, self._format_wait(self._estimator.wait(position))
+            ))
+        self._notify_positions(position + 1, self._queue.order(student.id))
+        self._changed()
 
         return
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    :name: dequeue()
-    :preconditions: At least one discord.Member instance is in the queue for a guild.
-    :postconditions: The first discord.Member instance in the queue for a guild
-                     is removed from the queue and returned.
+    :name: restore()
+    :preconditions: The student was queued in this guild before the bot restarted.
+    :postconditions: The OHQueueEntry is put back in its lane, as of when it queued,
+                     without notifying them or recording it again.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    async def dequeue(self) -> discord.Member:
-        if len(self._queue) == 0: return None
+    def restore(self, entry: OHQueueEntry) -> None:
+        if entry.lane not in self.LANES: entry.lane = self.DEFAULT_LANE
+        if entry.member_id not in self._queue:
+            self._queue.append(entry.member_id, entry, entry.lane, entry.enqueued_at)
+        self._changed()
+
+        return
 
-        # if the queue only has one student, don't recreate the list
-        if len(self._queue) == 1: return self._queue.pop()
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: dequeue()
+    :preconditions: At least one student is in the queue for a guild, or in the
+                    given lane of it.
+    :postconditions: The OHQueueEntry due first in the queue for a guild, or in the
+                     given lane, is removed from the queue and returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def dequeue(self, lane: str = None) -> OHQueueEntry:
+        key = self._queue.first_key(lane)
+        if key is None: return None
 
-        # if the queue for a guild has more than one person in it,
-        # move the rest of it's queue forward and return the discord.Member instance
-        # at index 0
-        student = self._queue[0]
-        self._queue = self._queue[1:len(self._queue)]
+        # take the entry out; everyone else moves forward without the queue
+        # being rebuilt
+        position, order = self._queue.position(key), self._queue.order(key)
+        student = self._queue.remove(key)
+        self._store.dequeue(self._guild_id, key)
+        self._positions.discard(key)
 
-        # notify other students in that guild's queue that their position has changed
-        for i in range(len(self._queue)):
-            await self._queue[i].send("Your new position in queue: %d." % (i + 1))
+        # notify the students behind them in that guild's queue that their
+        # position has changed
+        self._notify_positions(position, order)
+        self._changed()
 
         return student
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: remove()
-    :preconditions: The discord.Member object that is passed is present in the queue,
-                    or the discord.Member object that is present at the given
-                    position exists in the queue.
-    :postconditions: The passed discord.Member instance or the discord.Member
-                     instance at the passed position is removed from the queue.
+    :preconditions: The student with the passed id is present in the queue, or
+                    someone is present at the given position in the queue.
+    :postconditions: The OHQueueEntry of the student with the passed id, or the one
+                     at the passed position, is removed from the queue and returned.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    async def remove(self, student: discord.Member = None, position: int = None) -> None:
-        found = False
-
+    async def remove(self, student_id: int = None, position: int = None) -> OHQueueEntry:
         # using default parameters, we can check if an index was passed rather
-        # than a discord.Member object. if this is the case, verify that it
-        # exists as an index and set student to the discord.Member object at it
+        # than a student's id. if this is the case, verify that it exists as an
+        # index and set student_id to the id of the student at it
         if position is not None:
             if not 0 <= position < len(self._queue):
                 raise exceptions.BadPosition
 
-            student = self._queue[position]
+            student_id = self._queue.at(position).member_id
 
-        # iterate through a guild's queue and find the discord.Member instance.
-        # once the discord.Member instance has been found, notify the other members in queue
-        # their position has changed
-        for i in range(len(self._queue)):
-            if student == self._queue[i]: found = True
-            if found and self._queue[i] != student:
-                await self._queue[i].send("Your new position in queue: %d." % i)
+        # look up where the student sits in the queue and take them out, then
+        # notify every member that was behind them that their position has
+        # changed
+        position, order = self._queue.position(student_id), self._queue.order(student_id)
+        student = self._queue.remove(student_id)
+        self._store.dequeue(self._guild_id, student_id)
+        self._notify_positions(position, order)
+        self._changed()
 
-        # remove the discord.Member object from the queue and notify them
-        await student.send("You were removed from the queue.")
-        self._queue.remove(student)
-
-        return
+        # notify the removed student
+        self._positions.discard(student_id)
+        self._notifier.notify(self._recipient(student), "You were removed from the queue.")
 
+        return student
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: queue_emb()
     :preconditions: The queue is requested by either a Handler or Queueable.
-    :postconditions: The guild's current queue is returned.
+    :postconditions: The given page of the guild's current queue is returned. Pages
+                     past either end return the first or last page.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    def queue_emb(self) -> discord.Embed():
-        desc = ""
+    def queue_emb(self, page: int = 0) -> discord.Embed():
+        pages = self._render()
 
-        # if the queue is empty, set the description of the embed as "empty"
-        # else, add each student to the queue along with their position in it
-        if not self._queue: desc = "Empty queue."
-        else:
-            for i in range(len(self._queue)):
-                desc += "%d. %s\n" % (i + 1, self._queue[i].display_name)
+        return pages[max(0, min(page, len(pages) - 1))]
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: page_count()
+    :preconditions: OHQueue has been instantiated.
+    :postconditions: The number of pages the queue embed has is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def page_count(self) -> int:
+        return len(self._render())
 
-        # create the embed with the necessary information
-        queue = discord.Embed(
-                    title="Current Queue",
-                    color=discord.Color.blurple(),
-                    description=desc
-                )
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: watch()
+    :preconditions: OHQueue has been instantiated.
+    :postconditions: The callback is called with no arguments whenever the queue or
+                     its wait estimates change.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def watch(self, callback) -> None:
+        self._watchers.append(callback)
 
-        return queue
+        return
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: accepting()
@@ -121,40 +182,183 @@ class OHQueue:
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: end_oh()
-    :preconditions: All handlers in a discord.Guild instance have gone off duty.
-    :postconditions: The students are wiped from the queue after 15 minutes if
-                     office hours have not reopened.
+    :preconditions: All handlers in a discord.Guild instance have been off duty for
+                    EXPIRY seconds.
+    :postconditions: The students are wiped from the queue in one go if office
+                     hours have not reopened, are notified, and their OHQueueEntry
+                     instances are returned.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    async def end_oh(self) -> None:
-        # retain the queue for 15 minutes in the case another handler goes on duty
-        await asy_sleep(60 * 15)
+    def end_oh(self) -> [OHQueueEntry]:
+        # the wipe is cancelled when a handler goes back on duty, but check in
+        # case it was already due
+        if self._accepting: return []
 
-        # since accepting can change in the 15 minutes, we check if another handler
-        # has gone on duty. If they have, don't wipe the students from the queue
-        if self._accepting: return
+        self._store.clear_queue(self._guild_id)
 
-        for student in self._queue:
-            await student.send("Office hours have closed, so you were removed from the queue.")
-            self._queue.remove(student)
+        # the notifier sends these concurrently, within discord's rate limits
+        students = self._queue.clear()
+        for student in students:
+            self._positions.discard(student.member_id)
+            self._notifier.notify(self._recipient(student), "Office hours have closed, so you were removed from the queue.")
+        self._changed()
 
-        return
+        return students
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: is_empty()
     :preconditions: OHQueue has been instantiated.
-    :postconditions: A boolean that indicates if a guild's queue is empty is returned.
+    :postconditions: A boolean that indicates if a guild's queue, or the given lane
+                     of it, is empty is returned.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    def is_empty(self) -> bool:
+    def is_empty(self, lane: str = None) -> bool:
+        if lane is not None: return self._queue.lane_len(lane) == 0
+
         return len(self._queue) == 0
 
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: parse_lane()
+    :preconditions: OHQueue has been instantiated.
+    :postconditions: If the first word names a lane, that lane and the remaining
+                     words are returned. Otherwise the default lane and all of
+                     the words are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def parse_lane(self, words: (str,)) -> (str, (str,)):
+        if words and words[0].lower() in self.LANES: return words[0].lower(), words[1:]
+
+        return self.DEFAULT_LANE, words
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: check_lane()
+    :preconditions: OHQueue has been instantiated.
+    :postconditions: The lane's name is returned in lower case, or
+                     exceptions.UnknownLane is raised if there is no such lane.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def check_lane(self, lane: str) -> str:
+        if lane.lower() not in self.LANES: raise exceptions.UnknownLane(", ".join(self.LANES))
+
+        return lane.lower()
+
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: check()
     :preconditions: A member attempts to remove themself from a guild's queue.
-    :postconditions: A boolean that indicates if a discord.Member object that
-                     matches the passed id exists a guild's queue is returned.
+    :postconditions: A boolean that indicates if a student that matches the passed
+                     id exists in a guild's queue is returned.
     """""""""""""""""""""""""""""""""""""""""""""""""""
     def check(self, student_id: int) -> bool:
-        for member in self._queue:
-            if member.id == student_id: return True
+        return student_id in self._queue
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: eta()
+    :preconditions: OHQueue has been instantiated.
+    :postconditions: The queued student's position and estimated wait are returned.
+                     If they aren't queued, the position and estimated wait they
+                     would get by queueing in the given lane now are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def eta(self, student_id: int, lane: str = DEFAULT_LANE) -> (int, str):
+        if student_id in self._queue: position = self._queue.position(student_id)
+        else: position = self._queue.position_if(lane, time())
+
+        return position + 1, self._format_wait(self._estimator.wait(position))
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: set_on_duty()
+    :preconditions: The handler went on or off duty in this guild.
+    :postconditions: Wait estimates account for the handler only while they're on duty.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def set_on_duty(self, handler_id: int, on_duty: bool) -> None:
+        self._estimator.set_on_duty(handler_id, on_duty)
+        self._changed()
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: record_service()
+    :preconditions: One of this guild's sessions was closed.
+    :postconditions: The session's length is folded into the guild's and the
+                     handler's average session lengths.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def record_service(self, handler_id: int, seconds: float) -> None:
+        self._estimator.observe(handler_id, seconds)
+        self._changed()
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: position_stats()
+    :preconditions: OHQueue has been instantiated.
+    :postconditions: The number of position updates sent and suppressed by
+                     this guild's debouncer is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def position_stats(self) -> {str: int, str: int}:
+        return self._positions.get_stats()
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: set_position_window()
+    :preconditions: OHQueue has been instantiated.
+    :postconditions: Position updates are collapsed over the given number of seconds.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def set_position_window(self, window: float) -> None:
+        self._positions.set_window(window)
+
+        return
+
+    def _render(self) -> [discord.Embed]:
+        if self._pages is not None: return self._pages
+
+        # if the queue is empty, set the description of the embed as "empty"
+        # else, add each student to the queue along with their position in it
+        lines = [
+            "%d. %s (%s, %s)" % (
+                i + 1,
+                student.name,
+                student.lane,
+                self._format_wait(self._estimator.wait(i))
+            )
+            for i, student in enumerate(self._queue)
+        ]
+        chunks = [lines[i:i + self.PAGE_SIZE] for i in range(0, len(lines), self.PAGE_SIZE)] or [["Empty queue."]]
+
+        # create an embed with the necessary information for every page
+        self._pages = []
+        for i, chunk in enumerate(chunks):
+            page = discord.Embed(
+                        title="Current Queue",
+                        color=discord.Color.blurple(),
+                        description="\n".join(chunk)
+                    )
+            if len(chunks) > 1: page.set_footer(text="Page %d/%d, %d queued" % (i + 1, len(chunks), len(lines)))
+            self._pages.append(page)
+
+        return self._pages
+
+    def _changed(self) -> None:
+        self._pages = None
+        for callback in self._watchers: callback()
+
+        return
+
+    def _format_wait(self, seconds: float) -> str:
+        if seconds is None: return "unknown"
+        if seconds < 60: return "under a minute"
+        if seconds < 60 * 60: return "about %d min" % round(seconds / 60)
+
+        return "about %dh %02dm" % divmod(round(seconds / 60), 60)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: _notify_positions()
+    :preconditions: The students due after the given order have moved in the queue,
+                    and the first of them is now at the given position.
+    :postconditions: A position update is scheduled for every student due after
+                     the given order. Updates within the debounce window are
+                     collapsed into the latest one.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def _notify_positions(self, position: int, order: tuple) -> None:
+        # only the students behind the change are visited, merged across lanes
+        for i, student in enumerate(self._queue.iter_after(order), position):
+            self._positions.notify(self._recipient(student), "Your new position in queue: %d." % (i + 1))
+
+        return
 
-        return False
+    def _recipient(self, student: OHQueueEntry) -> OHRecipient:
+        # the member is only looked up if and when the DM is actually sent
+        return OHRecipient(self._bot, student.member_id)
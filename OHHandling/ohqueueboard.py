@@ -0,0 +1,81 @@
+import discord
+from asyncio import ensure_future, get_event_loop
+from OHHandling.ohqueue import OHQueue
+
+class OHQueueBoard:
+    # discord allows five edits to a channel's messages every five seconds; one
+    # every few seconds leaves the rest of the channel plenty of room
+    MIN_INTERVAL = 3.0
+
+    def __init__(self, queue: OHQueue, channel, min_interval: float = MIN_INTERVAL):
+        # channel is called to look the board's channel up each time, since it
+        # can be deleted and recreated while the bot is running
+        self._queue = queue
+        self._channel = channel
+        self._min_interval = min_interval
+        self._message = None
+        self._last_update = float("-inf")
+        self._handle = None
+        self._task = None
+        self._dirty = False
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: touch()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The board is scheduled to show the queue as it is when the
+                     update runs, at most once every min_interval seconds. Touches
+                     before then are folded into that update.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def touch(self) -> None:
+        # an update in flight may have rendered the queue before this change
+        if self._task is not None and not self._task.done():
+            self._dirty = True
+            return
+
+        if self._handle is not None: return
+
+        loop = get_event_loop()
+        delay = max(0.0, self._last_update + self._min_interval - loop.time())
+        self._handle = loop.call_later(delay, self._flush)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: stop()
+    :preconditions: OHQueueBoard has been instantiated.
+    :postconditions: Any scheduled update is cancelled.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def stop(self) -> None:
+        if self._handle is not None: self._handle.cancel()
+        self._handle = None
+
+        return
+
+    def _flush(self) -> None:
+        self._handle = None
+        self._task = ensure_future(self._update())
+
+        return
+
+    async def _update(self) -> None:
+        self._last_update = get_event_loop().time()
+        self._dirty = False
+        embed = self._queue.queue_emb()
+
+        try:
+            if self._message is not None:
+                try:
+                    await self._message.edit(embed=embed)
+                except discord.NotFound:
+                    self._message = None
+
+            # post a new board if there isn't one, or it was deleted
+            if self._message is None:
+                channel = self._channel()
+                if channel is not None: self._message = await channel.send(embed=embed)
+        except discord.HTTPException as error:
+            print("Failed to update the queue board: %s" % error)
+
+        if self._dirty: self._handle = get_event_loop().call_later(self._min_interval, self._flush)
+
+        return
@@ -0,0 +1,16 @@
+class OHQueueEntry:
+    # one of these is kept per queued student instead of their discord.Member,
+    # so the queue doesn't pin members in discord.py's cache and every field
+    # can be stored or sent elsewhere as is. The member is looked up only when
+    # they're DMed or accepted
+    __slots__ = ("member_id", "name", "reason", "enqueued_at", "lane")
+
+    def __init__(self, member_id: int, name: str, reason: str, enqueued_at: float, lane: str):
+        self.member_id = member_id
+        self.name = name
+        self.reason = reason
+        self.enqueued_at = enqueued_at
+        self.lane = lane
+
+    def __repr__(self) -> str:
+        return "OHQueueEntry(%d, %r, %s)" % (self.member_id, self.name, self.lane)
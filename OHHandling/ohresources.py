@@ -0,0 +1,65 @@
+import discord
+from discord.utils import get as duget
+
+class OHResources:
+    def __init__(self):
+        # guild id -> (kind, name) -> id. Looking an id back up on the guild is a
+        # dict lookup, where finding a role or channel by name is a scan over
+        # every one the guild has
+        self._ids = {}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: role()
+    :preconditions: The bot client is in the guild.
+    :postconditions: The guild's discord.Role instance with the given name is
+                     returned, or None if it doesn't have one.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def role(self, guild: discord.Guild, name: str) -> discord.Role:
+        return self._lookup(guild, "role", name, guild.get_role, lambda: guild.roles)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: channel()
+    :preconditions: The bot client is in the guild.
+    :postconditions: The guild's discord.TextChannel instance with the given name
+                     is returned, or None if it doesn't have one.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def channel(self, guild: discord.Guild, name: str) -> discord.TextChannel:
+        return self._lookup(guild, "channel", name, guild.get_channel, lambda: guild.text_channels)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: invalidate()
+    :preconditions: A role or channel was created, renamed or deleted in the guild.
+    :postconditions: Whatever was cached under the name is looked up again the
+                     next time it's needed.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def invalidate(self, guild_id: int, kind: str, name: str) -> None:
+        ids = self._ids.get(guild_id)
+        if ids is not None: ids.pop((kind, name), None)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: forget()
+    :preconditions: The bot client was removed from the guild.
+    :postconditions: Everything cached for the guild is dropped.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def forget(self, guild_id: int) -> None:
+        self._ids.pop(guild_id, None)
+
+        return
+
+    def _lookup(self, guild: discord.Guild, kind: str, name: str, by_id, candidates):
+        ids = self._ids.setdefault(guild.id, {})
+        key = (kind, name)
+
+        # the name check catches a rename whose event we never saw
+        if key in ids:
+            found = by_id(ids[key])
+            if found is not None and found.name == name: return found
+
+        # misses aren't cached, so a role or channel created later is still found
+        found = duget(candidates(), name=name)
+        if found is not None: ids[key] = found.id
+        else: ids.pop(key, None)
+
+        return found
@@ -0,0 +1,157 @@
+import discord
+from asyncio import ensure_future, gather
+
+class OHRoom:
+    def __init__(self, role: discord.Role, category: discord.CategoryChannel,
+                 text: discord.TextChannel, voice: discord.VoiceChannel):
+        self.role = role
+        self.category = category
+        self.text = text
+        self.voice = voice
+
+class OHRoomPool:
+    IDLE_NAME = "Idle Session Room"
+
+    def __init__(self, guild: discord.Guild):
+        self._guild = guild
+        self._idle = []
+        self._target = 0
+        self._refill_task = None
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: take()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: An idle OHRoom is removed from the pool and returned, or None
+                     if the pool is empty. The pool is refilled in the background.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def take(self) -> OHRoom:
+        room = self._idle.pop() if self._idle else None
+        self._schedule_refill()
+
+        return room
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: give_back()
+    :preconditions: The OHRoom was taken from this pool and its session has ended.
+    :postconditions: The OHRoom's role is taken from the members, its text channel is
+                     replaced by an empty copy, it is renamed and returned to the pool.
+                     If the room can't be scrubbed, whatever is left of it is deleted.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def give_back(self, room: OHRoom, members: [discord.Member]) -> None:
+        try:
+            # cloning keeps the channel's permissions without any of its messages,
+            # which is a single call no matter how long the session was
+            old_text = room.text
+            room.text, *_ = await gather(
+                old_text.clone(name="session-text"),
+                room.role.edit(name=self.IDLE_NAME),
+                room.category.edit(name=self.IDLE_NAME),
+                *(member.remove_roles(room.role) for member in members)
+            )
+            await old_text.delete()
+        except discord.HTTPException:
+            return await self._delete(room)
+
+        self._idle.append(room)
+        self._schedule_refill()
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: resize()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The pool is grown or shrunk to the given number of idle rooms
+                     in the background.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def resize(self, target: int) -> None:
+        self._target = max(target, 0)
+        self._schedule_refill()
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: drain()
+    :preconditions: OHRoomPool has been instantiated.
+    :postconditions: Every idle room in the pool is deleted.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def drain(self) -> None:
+        self._target = 0
+        idle, self._idle = self._idle, []
+        await gather(*(self._delete(room) for room in idle), return_exceptions=True)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: resource_ids()
+    :preconditions: OHRoomPool has been instantiated.
+    :postconditions: The ids of the role, category and channels of every idle room
+                     in the pool are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def resource_ids(self) -> {int}:
+        return {resource.id for room in self._idle for resource in (room.role, room.category, room.text, room.voice)}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: __len__()
+    :preconditions: OHRoomPool has been instantiated.
+    :postconditions: The number of idle rooms in the pool is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def __len__(self) -> int:
+        return len(self._idle)
+
+    def _schedule_refill(self) -> None:
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = ensure_future(self._refill())
+
+        return
+
+    async def _refill(self) -> None:
+        # keep going until the pool matches the target, since it can change while
+        # rooms are being created or deleted
+        while len(self._idle) != self._target:
+            missing = self._target - len(self._idle)
+
+            if missing > 0:
+                rooms = await gather(*(self._create() for _ in range(missing)), return_exceptions=True)
+                rooms = [room for room in rooms if isinstance(room, OHRoom)]
+                self._idle.extend(rooms)
+
+                # stop rather than hammering discord if nothing could be created
+                if not rooms: return
+            else:
+                extra, self._idle = self._idle[missing:], self._idle[:missing]
+                await gather(*(self._delete(room) for room in extra), return_exceptions=True)
+
+        return
+
+    async def _create(self) -> OHRoom:
+        guild = self._guild
+        role = await guild.create_role(name=self.IDLE_NAME)
+
+        # the room is hidden from everyone until its role is handed out
+        perms = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            role: discord.PermissionOverwrite(read_messages=True)
+        }
+        category = await guild.create_category(name=self.IDLE_NAME, overwrites=perms)
+
+        text, voice = await gather(
+            guild.create_text_channel(name="session-text", category=category),
+            guild.create_voice_channel(name="Session Voice", category=category)
+        )
+
+        return OHRoom(role, category, text, voice)
+
+    async def _delete(self, room: OHRoom) -> None:
+        await gather(
+            room.role.delete(),
+            room.voice.delete(),
+            room.text.delete(),
+            return_exceptions=True
+        )
+
+        try:
+            await room.category.delete()
+        except discord.HTTPException:
+            pass
+
+        return
@@ -2,30 +2,67 @@ import discord
 from discord.ext import commands
 from discord.utils import get as duget
 from pathvalidate import sanitize_filename as sanitize
-from json import dumps
-from pytz import timezone
+from pytz import timezone, utc
+from asyncio import gather
+from datetime import datetime
+from time import perf_counter
+from OHHandling.ohroompool import OHRoom, OHRoomPool
+from OHHandling.ohtranscript import OHTranscript, OHTranscriptWriter
 
 class OHSession:
-    def __init__(self, handler, student):
+    def __init__(self, handler, student, writer: OHTranscriptWriter):
         self._handler = handler
         self._student = student
+        self._writer = writer
         self._role = None
         self._category = None
         self._text = None
         self._voice = None
         self._is_open = False
+        self._opened_at = None
+        self._transcript = None
+        self._transcript_file = None
+        self._last_recorded = None
+        self._timings = {}
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: open()
     :preconditions: This OHSession has been instantiated.
     :postconditions: A role, a category, a text channel, and a voice channel
-                     is created in a guild.
+                     is created in a guild, or the passed warm OHRoom is renamed
+                     and handed out. The time each step took is recorded.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    async def open(self, guild: discord.Guild) -> None:
+    async def open(self, guild: discord.Guild, room: OHRoom = None) -> None:
         session_name = "Session for %s" % self._student.display_name
+        started = perf_counter()
+        self._opened_at = datetime.now(utc)
+        self._start_transcript(guild.id, self._transcript_name(), self._student.id, self._handler.id)
 
-        # create a discord.Role object based off of the student's name
-        self._role = await guild.create_role(name=session_name)
+        # a room from the pool already has everything, so it only needs renaming
+        # and handing to the handler and student
+        if room is not None:
+            self._role, self._category = room.role, room.category
+            self._text, self._voice = room.text, room.voice
+
+            student = self._student.mention
+            handler = self._handler.mention
+            welcome, *_ = await gather(
+                self._timed("welcome", self._text.send("Hello %s! Welcome to your session with %s!" % (student, handler))),
+                self._timed("role", self._role.edit(name=session_name)),
+                self._timed("category", self._category.edit(name=session_name, position=0)),
+                self._timed("handler_role", self._handler.add_roles(self._role)),
+                self._timed("student_role", self._student.add_roles(self._role))
+            )
+
+            self._timings["total"] = perf_counter() - started
+            await self._transcript.append(welcome)
+            self._is_open = True
+
+            return welcome
+
+        # create a discord.Role object based off of the student's name; everything
+        # else in the session depends on it
+        self._role = await self._timed("role", guild.create_role(name=session_name))
 
         # create a permission dictionary permissions for the category and it's channels
         perms = {
@@ -33,113 +70,140 @@ class OHSession:
             self._role: discord.PermissionOverwrite(read_messages=True)
         }
 
-        # create a new hidden category in a guild and set it to be at the top of
-        # the server's channel list
-        self._category = await guild.create_category(name=session_name, overwrites=perms)
-        await self._category.edit(position=0)
-
-        # create a text and voice channel for the category
-        self._text = await guild.create_text_channel(
-                        name="session-text",
-                        category=self._category
-                     )
-        self._voice = await guild.create_voice_channel(
-                        name="Session Voice",
-                        category=self._category
-                      )
-
-        # add the session role to the handler and student
-        await self._handler.add_roles(self._role)
-        await self._student.add_roles(self._role)
+        # the text channel and welcome message have to happen in order, but
+        # nothing else depends on either of them
+        async def text_and_welcome() -> discord.Message:
+            self._text = await self._timed("text", guild.create_text_channel(
+                            name="session-text",
+                            category=self._category
+                         ))
+
+            student = self._student.mention
+            handler = self._handler.mention
+            return await self._timed("welcome", self._text.send("Hello %s! Welcome to your session with %s!" % (student, handler)))
 
+        async def voice() -> None:
+            self._voice = await self._timed("voice", guild.create_voice_channel(
+                            name="Session Voice",
+                            category=self._category
+                          ))
+
+        # create a new hidden category in a guild, then move it to the top of the
+        # server's channel list while its channels are created
+        async def category() -> discord.Message:
+            self._category = await self._timed("category", guild.create_category(name=session_name, overwrites=perms))
+
+            welcome, *_ = await gather(
+                text_and_welcome(),
+                voice(),
+                self._timed("position", self._category.edit(position=0))
+            )
+            return welcome
+
+        # add the session role to the handler and student while the category is
+        # being built
+        welcome, *_ = await gather(
+            category(),
+            self._timed("handler_role", self._handler.add_roles(self._role)),
+            self._timed("student_role", self._student.add_roles(self._role))
+        )
+
+        self._timings["total"] = perf_counter() - started
+        await self._transcript.append(welcome)
         self._is_open = True
 
-        # when the channel opens, send a message pinging the student and the handler
-        student = self._student.mention
-        handler = self._handler.mention
-        return await self._text.send("Hello %s! Welcome to your session with %s!" % (student, handler))
+        return welcome
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: catch_up()
+    :preconditions: This OHSession has been opened and will receive its text
+                    channel's messages through record() from now on.
+    :postconditions: Any message sent in the text channel before it was being
+                     recorded is added to the transcript.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def catch_up(self) -> None:
+        # a restored session picks up after the last message that made it into
+        # its transcript, a new one from when it was opened
+        after = self._opened_at.replace(tzinfo=None)
+        if self._last_recorded is not None: after = discord.Object(self._last_recorded)
+
+        # discord.py stops at 100 messages unless told otherwise
+        async for message in self._text.history(limit=None, after=after, oldest_first=True):
+            await self._transcript.append(message)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: restore()
+    :preconditions: The session described by the state was open in the guild before
+                    the bot restarted. Its handler or student is None if they have
+                    left the guild.
+    :postconditions: If both are still there and the session's role and channels still
+                     exist, an open OHSession using them is returned. Otherwise,
+                     whatever is left of the session is deleted, its transcript is
+                     archived, and None is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    @classmethod
+    async def restore(cls, guild: discord.Guild, handler: discord.Member, student: discord.Member,
+                      writer: OHTranscriptWriter, state: {str: int}):
+        session = cls(handler, student, writer)
+        session._role = guild.get_role(state["role_id"])
+        session._category = guild.get_channel(state["category_id"])
+        session._text = guild.get_channel(state["text_id"])
+        session._voice = guild.get_channel(state["voice_id"])
+        session._opened_at = datetime.fromtimestamp(state["opened_at"], utc)
+        session._start_transcript(guild.id, state["transcript"], state["student_id"], state["handler_id"])
+
+        resources = [session._role, session._voice, session._text, session._category]
+        if None not in resources and handler is not None and student is not None:
+            # catching up starts after the last message that made it into the
+            # log, and skips any that are already in it
+            recorded = await writer.recorded_ids(state["transcript"])
+            session._transcript.resume(recorded)
+            session._last_recorded = recorded[-1] if recorded else None
+            session._is_open = True
+
+            return session
+
+        # the session can't be used anymore, so clean up after it like close() would
+        await session._transcript.finalize()
+        await gather(*(resource.delete() for resource in resources if resource is not None), return_exceptions=True)
+
+        return None
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: record()
+    :preconditions: This OHSession has been opened and the discord.Message instance
+                    was sent in its text channel.
+    :postconditions: The message is queued to be appended to this session's transcript.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def record(self, message: discord.Message) -> None:
+        if self._is_open: await self._transcript.append(message)
+
+        return
 
     """""""""""""""""""""""""""""""""""""""""""""""""""
     :name: close()
     :preconditions: This OHSession has been opened.
     :postconditions: The existing discord.Role, discord.Category, discord.TextChannel,
-                     and discord.VoiceChannel instances are deleted.
+                     and discord.VoiceChannel instances are deleted, or scrubbed and
+                     returned to the passed OHRoomPool.
     """""""""""""""""""""""""""""""""""""""""""""""""""
-    async def close(self, channel: discord.TextChannel) -> None:
+    async def close(self, channel: discord.TextChannel, pool: OHRoomPool = None) -> None:
         if not self._is_open:
             return await channel.send("There isn't a session open!")
 
-        # using a lambda function to return a clean, usable filename from a string
-        fileize = lambda string: sanitize(string.replace(' ', '_'))
-
-        # gather and clean the student and handler names so they can be used
-        # in a file name
-        student_name = fileize(self._student.display_name)
-        handler_name = fileize(self._handler.display_name)
-
-        # convert the channel.created_at datetime instance's timezone to EST
-        channel_est_converted = self._text.created_at.astimezone(timezone("EST"))
-
-        # create a file in /sessionlogs/ that follows this naming format:
-        # Student_name_Handler_name_MonthDayYear_HourMinute.txt
-        file_name = "OHHandling/sessionlogs/%s_%s_%02d%02d%d_%02d%02d.txt" % (
-                                student_name,
-                                handler_name,
-                                channel_est_converted.month,
-                                channel_est_converted.day,
-                                channel_est_converted.year,
-                                channel_est_converted.hour,
-                                channel_est_converted.minute
-                            )
+        # everything was written while the session was live, so the log only
+        # has to be finalized. Its attachments are stored first, since the
+        # room's messages are gone once it is deleted or scrubbed; archiving the
+        # log happens on the writer thread, and closing doesn't wait for it
+        await self._transcript.finalize()
+        self._is_open = False
 
-        # create and open the file named above
-        with open(file_name, 'w') as file:
-            messages = []
-
-            # iterate through all messages in self._text and add them to the
-            # messages list for dumping cleanly into a file
-            async for message in self._text.history(limit=1000, oldest_first=True):
-
-                # convert every message's datetime instance from utc to est for
-                # proper timestamps in the message, which follows this format:
-                # [Hour:Minute] Author Name: Content [[[NUM ATTACHMENTS]]]
-                message_est_converted = message.created_at.astimezone(timezone("EST"))
-
-                # if there is at least one file attached and this message has a
-                # text body to it, display the text along with the number of files
-                # attached
-                if message.attachments and message.content:
-                    messages.append("[%02d:%02d] %s: %s [[[%d ATTACHMENTS]]]" % (
-                                        message_est_converted.hour,
-                                        message_est_converted.minute,
-                                        message.author.display_name,
-                                        message.content,
-                                        len(message.attachments)
-                                    ))
-
-                # if there is at least one attachment and no text body, just add
-                # the number of files attached
-                elif message.attachments and not message.content:
-                    messages.append("[%02d:%02d] %s: [[[%d ATTACHMENTS]]]" % (
-                                        message_est_converted.hour,
-                                        message_est_converted.minute,
-                                        message.author.display_name,
-                                        len(message.attachments)
-                                    ))
-
-                # if there is just a body f text with no attachments, only display
-                # that
-                else:
-                    messages.append("[%02d:%02d] %s: %s" % (
-                                        message_est_converted.hour,
-                                        message_est_converted.minute,
-                                        message.author.display_name,
-                                        message.content,
-                                    ))
-
-            # dump the entire history of the channel into the created file with
-            # an indent of zero for readability
-            file.write(dumps(messages, indent=0))
+        # hand the room back to the pool if there is one
+        if pool is not None:
+            room = OHRoom(self._role, self._category, self._text, self._voice)
+            return await pool.give_back(room, [self._handler, self._student])
 
         # delete all data in a guild associated with this OHSession
         await self._role.delete()
@@ -157,3 +221,103 @@ class OHSession:
     """""""""""""""""""""""""""""""""""""""""""""""""""
     def get_members(self) -> {str: discord.Member, str: discord.Member}:
         return {"handler": self._handler, "student": self._student}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: get_handler() / get_student()
+    :preconditions: This OHSession has been instantiated.
+    :postconditions: The handler's or the student's discord.Member instance is
+                     returned, without building get_members()' dictionary.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def get_handler(self) -> discord.Member:
+        return self._handler
+
+    def get_student(self) -> discord.Member:
+        return self._student
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: get_state()
+    :preconditions: This OHSession has been opened.
+    :postconditions: The ids and times needed to restore this session after a
+                     restart are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def get_state(self) -> {str: int}:
+        return {
+            "handler_id": self._handler.id,
+            "student_id": self._student.id,
+            "role_id": self._role.id,
+            "category_id": self._category.id,
+            "text_id": self._text.id,
+            "voice_id": self._voice.id,
+            "opened_at": self._opened_at.timestamp(),
+            "transcript": self._transcript_file
+        }
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: get_duration()
+    :preconditions: This OHSession has been opened.
+    :postconditions: The number of seconds since this session was opened is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def get_duration(self) -> float:
+        return (datetime.now(utc) - self._opened_at).total_seconds()
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: get_text_id()
+    :preconditions: This OHSession has been opened.
+    :postconditions: The id of this session's discord.TextChannel is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def get_text_id(self) -> int:
+        return self._text.id
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: get_timings()
+    :preconditions: This OHSession has been opened.
+    :postconditions: The seconds each step of open() took, along with the total,
+                     are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def get_timings(self) -> {str: float}:
+        return dict(self._timings)
+
+    async def _timed(self, step: str, coro):
+        started = perf_counter()
+        try:
+            return await coro
+        finally:
+            self._timings[step] = perf_counter() - started
+
+    def _start_transcript(self, guild_id: int, file_name: str, student_id: int, handler_id: int) -> None:
+        self._transcript_file = file_name
+        self._transcript = OHTranscript(
+                                self._writer,
+                                file_name,
+                                guild_id,
+                                student_id,
+                                handler_id,
+                                self._opened_at.astimezone(timezone("EST")).date().isoformat()
+                            )
+
+        return
+
+    def _transcript_name(self) -> str:
+        # using a lambda function to return a clean, usable filename from a string
+        fileize = lambda string: sanitize(string.replace(' ', '_'))
+
+        # gather and clean the student and handler names so they can be used
+        # in a file name
+        student_name = fileize(self._student.display_name)
+        handler_name = fileize(self._handler.display_name)
+
+        # convert the time the session was opened to EST; a pooled room's
+        # channel can be much older than the session itself
+        opened_est_converted = self._opened_at.astimezone(timezone("EST"))
+
+        # the log in /sessionlogs/ follows this naming format:
+        # Student_name_Handler_name_MonthDayYear_HourMinute.jsonl
+        return "OHHandling/sessionlogs/%s_%s_%02d%02d%d_%02d%02d.jsonl" % (
+                    student_name,
+                    handler_name,
+                    opened_est_converted.month,
+                    opened_est_converted.day,
+                    opened_est_converted.year,
+                    opened_est_converted.hour,
+                    opened_est_converted.minute
+                )
@@ -0,0 +1,158 @@
+from OHHandling.ohsession import OHSession
+
+class OHSessionRegistry:
+    def __init__(self):
+        # every open session in a guild, indexed each way a command or event
+        # needs to find one
+        self._by_handler = {}
+        self._by_student = {}
+        self._by_channel = {}
+
+        # handlers who have taken a student and are still opening their session,
+        # mapped to that student, and sessions that are no longer open but whose
+        # rooms are still being closed
+        self._opening = {}
+        self._closing = set()
+
+        # the stored state of sessions from before a restart whose handler or
+        # student couldn't be looked up yet, by handler. Their rooms may well
+        # still be in use, so they count as taken until they're resolved
+        self._held = {}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: add()
+    :preconditions: The OHSession has been opened and isn't registered yet.
+    :postconditions: The OHSession can be found by its handler, its student and its
+                     text channel.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def add(self, session: OHSession) -> None:
+        self._opening.pop(session.get_handler().id, None)
+        self._by_handler[session.get_handler().id] = session
+        self._by_student[session.get_student().id] = session
+        self._by_channel[session.get_text_id()] = session
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: remove()
+    :preconditions: The OHSession is registered.
+    :postconditions: The OHSession can no longer be found. Its rooms are still
+                     counted by resource_ids() until closed() is called.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def remove(self, session: OHSession) -> None:
+        self._by_handler.pop(session.get_handler().id, None)
+        self._by_student.pop(session.get_student().id, None)
+        self._by_channel.pop(session.get_text_id(), None)
+        self._closing.add(session)
+
+        return
+
+    def closed(self, session: OHSession) -> None:
+        self._closing.discard(session)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: reserve() / release()
+    :preconditions: OHSessionRegistry has been instantiated.
+    :postconditions: The handler and student are held as busy while their session is
+                     being opened, or no longer are if opening it failed. add()
+                     releases them once the session is open.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def reserve(self, handler_id: int, student_id: int) -> None:
+        self._opening[handler_id] = student_id
+
+        return
+
+    def release(self, handler_id: int) -> None:
+        self._opening.pop(handler_id, None)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: busy()
+    :preconditions: OHSessionRegistry has been instantiated.
+    :postconditions: A boolean that indicates if the member is handling, being helped
+                     in, or opening a session is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def busy(self, member_id: int) -> bool:
+        return (
+            member_id in self._by_handler
+            or member_id in self._by_student
+            or member_id in self._opening
+            or member_id in self._opening.values()
+            or member_id in self._held
+            or any(state["student_id"] == member_id for state in self._held.values())
+        )
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: hold() / unhold() / held()
+    :preconditions: OHSessionRegistry has been instantiated.
+    :postconditions: The stored state of a session that couldn't be restored yet is
+                     kept, or no longer is, or every one kept is returned. While it is
+                     kept, its handler and student are busy and its rooms are counted
+                     by resource_ids().
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def hold(self, state: {str: int}) -> None:
+        self._held[state["handler_id"]] = state
+
+        return
+
+    def unhold(self, handler_id: int) -> None:
+        self._held.pop(handler_id, None)
+
+        return
+
+    def held(self) -> [{str: int}]:
+        return list(self._held.values())
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: opening()
+    :preconditions: OHSessionRegistry has been instantiated.
+    :postconditions: A boolean that indicates if any session is still being opened,
+                     in rooms that can't be told apart from abandoned ones yet, is
+                     returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def opening(self) -> bool:
+        return len(self._opening) > 0
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: resource_ids()
+    :preconditions: OHSessionRegistry has been instantiated.
+    :postconditions: The ids of the role, category and channels of every open,
+                     closing or held session are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def resource_ids(self) -> {int}:
+        ids = set()
+        states = [session.get_state() for session in list(self._by_handler.values()) + list(self._closing)]
+        for state in states + self.held():
+            ids.update((state["role_id"], state["category_id"], state["text_id"], state["voice_id"]))
+
+        return ids
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: by_handler() / by_student() / by_channel()
+    :preconditions: OHSessionRegistry has been instantiated.
+    :postconditions: The OHSession the member is handling or being helped in, or
+                     whose text channel has the given id, is returned. None is
+                     returned if there isn't one.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def by_handler(self, handler_id: int) -> OHSession:
+        return self._by_handler.get(handler_id)
+
+    def by_student(self, student_id: int) -> OHSession:
+        return self._by_student.get(student_id)
+
+    def by_channel(self, channel_id: int) -> OHSession:
+        return self._by_channel.get(channel_id)
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: __len__() / __iter__()
+    :preconditions: OHSessionRegistry has been instantiated.
+    :postconditions: The number of open sessions is returned, or they are iterated.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def __len__(self) -> int:
+        return len(self._by_handler)
+
+    def __iter__(self):
+        return iter(list(self._by_handler.values()))
@@ -0,0 +1,368 @@
+import sqlite3
+from json import dumps, loads
+from time import time
+
+# redis is only needed for the redis:// backend
+try:
+    import redis
+except ImportError:
+    redis = None
+
+class OHStore:
+    PATH = "OHHandling/state.db"
+
+    # how long a shard's count of accepting guilds counts towards the presence
+    # after it last reported, so a shard that died stops being counted
+    PRESENCE_TTL = 300
+
+    def __init__(self, path: str = PATH):
+        # WAL lets every write be a short append to the log instead of a rewrite
+        # of the database, and NORMAL only syncs at checkpoints, which keeps the
+        # writes cheap enough to make straight from the event loop
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS queue (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                member_id INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                lane TEXT NOT NULL DEFAULT 'general',
+                UNIQUE (guild_id, member_id)
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                guild_id INTEGER NOT NULL,
+                handler_id INTEGER NOT NULL,
+                student_id INTEGER NOT NULL,
+                role_id INTEGER NOT NULL,
+                category_id INTEGER NOT NULL,
+                text_id INTEGER NOT NULL,
+                voice_id INTEGER NOT NULL,
+                opened_at REAL NOT NULL,
+                transcript TEXT NOT NULL,
+                PRIMARY KEY (guild_id, handler_id)
+            );
+            CREATE TABLE IF NOT EXISTS duty (
+                guild_id INTEGER NOT NULL,
+                handler_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, handler_id)
+            );
+            CREATE TABLE IF NOT EXISTS presence (
+                shard TEXT PRIMARY KEY,
+                accepting INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+        # queues stored before lanes existed go in the default lane
+        if "lane" not in [row[1] for row in self._db.execute("PRAGMA table_info(queue)")]:
+            self._db.execute("ALTER TABLE queue ADD COLUMN lane TEXT NOT NULL DEFAULT 'general'")
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: enqueue()
+    :preconditions: The member was appended to the guild's OHQueue.
+    :postconditions: The member is recorded at the back of the guild's stored queue,
+                     along with the lane they queued in.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def enqueue(self, guild_id: int, member_id: int, reason: str, enqueued_at: float, lane: str) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO queue (guild_id, member_id, reason, enqueued_at, lane) VALUES (?, ?, ?, ?, ?)",
+            (guild_id, member_id, reason, enqueued_at, lane)
+        )
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: dequeue()
+    :preconditions: The member was removed from the guild's OHQueue.
+    :postconditions: The member is removed from the guild's stored queue.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def dequeue(self, guild_id: int, member_id: int) -> None:
+        self._db.execute("DELETE FROM queue WHERE guild_id = ? AND member_id = ?", (guild_id, member_id))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: clear_queue()
+    :preconditions: The guild's OHQueue was wiped.
+    :postconditions: The guild's stored queue is emptied.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def clear_queue(self, guild_id: int) -> None:
+        self._db.execute("DELETE FROM queue WHERE guild_id = ?", (guild_id,))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: open_session()
+    :preconditions: An OHSession was opened in the guild.
+    :postconditions: The session's members, room and open time are recorded.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def open_session(self, guild_id: int, state: {str: int}) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                guild_id,
+                state["handler_id"],
+                state["student_id"],
+                state["role_id"],
+                state["category_id"],
+                state["text_id"],
+                state["voice_id"],
+                state["opened_at"],
+                state["transcript"]
+            )
+        )
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: close_session()
+    :preconditions: The handler's OHSession in the guild was closed.
+    :postconditions: The session's record is removed.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def close_session(self, guild_id: int, handler_id: int) -> None:
+        self._db.execute("DELETE FROM sessions WHERE guild_id = ? AND handler_id = ?", (guild_id, handler_id))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: set_duty()
+    :preconditions: The handler went on or off duty in the guild.
+    :postconditions: The handler's duty status is recorded.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def set_duty(self, guild_id: int, handler_id: int, on_duty: bool) -> None:
+        if on_duty:
+            self._db.execute("INSERT OR IGNORE INTO duty VALUES (?, ?)", (guild_id, handler_id))
+        else:
+            self._db.execute("DELETE FROM duty WHERE guild_id = ? AND handler_id = ?", (guild_id, handler_id))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: load()
+    :preconditions: OHStore has been instantiated.
+    :postconditions: The guild's stored queue (in order), sessions and on duty
+                     handlers are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def load(self, guild_id: int) -> {str: list}:
+        queue = self._db.execute(
+            "SELECT member_id, reason, enqueued_at, lane FROM queue WHERE guild_id = ? ORDER BY seq",
+            (guild_id,)
+        ).fetchall()
+
+        columns = ("handler_id", "student_id", "role_id", "category_id", "text_id", "voice_id", "opened_at", "transcript")
+        sessions = [dict(zip(columns, row)) for row in self._db.execute(
+            "SELECT %s FROM sessions WHERE guild_id = ?" % ", ".join(columns),
+            (guild_id,)
+        )]
+
+        duty = [row[0] for row in self._db.execute("SELECT handler_id FROM duty WHERE guild_id = ?", (guild_id,))]
+
+        return {"queue": queue, "sessions": sessions, "duty": duty}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: guilds()
+    :preconditions: OHStore has been instantiated.
+    :postconditions: The ids of every guild with anything stored are returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def guilds(self) -> {int}:
+        return {row[0] for row in self._db.execute(
+            "SELECT guild_id FROM queue UNION SELECT guild_id FROM sessions UNION SELECT guild_id FROM duty"
+        )}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: forget_guild()
+    :preconditions: The bot was removed from the guild, or its state couldn't be restored.
+    :postconditions: Everything stored for the guild is removed.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def forget_guild(self, guild_id: int) -> None:
+        self._db.execute("BEGIN")
+        for table in ("queue", "sessions", "duty"):
+            self._db.execute("DELETE FROM %s WHERE guild_id = ?" % table, (guild_id,))
+        self._db.execute("COMMIT")
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: set_accepting()
+    :preconditions: OHStore has been instantiated.
+    :postconditions: The number of guilds accepting students on the given shards
+                     is recorded.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def set_accepting(self, shard: str, accepting: int) -> None:
+        self._db.execute("INSERT OR REPLACE INTO presence VALUES (?, ?, ?)", (shard, accepting, time()))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: total_accepting()
+    :preconditions: OHStore has been instantiated.
+    :postconditions: The number of guilds accepting students across every shard
+                     that reported within PRESENCE_TTL is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def total_accepting(self) -> int:
+        row = self._db.execute(
+            "SELECT SUM(accepting) FROM presence WHERE updated_at > ?",
+            (time() - self.PRESENCE_TTL,)
+        ).fetchone()
+
+        return row[0] or 0
+
+class OHMemoryStore:
+    # keeps nothing across restarts and shares nothing between processes, for
+    # running a single process without a database, and for the load test
+    def __init__(self):
+        self._queues = {}
+        self._sessions = {}
+        self._duty = {}
+        self._accepting = {}
+
+    def enqueue(self, guild_id: int, member_id: int, reason: str, enqueued_at: float, lane: str) -> None:
+        queue = self._queues.setdefault(guild_id, {})
+        queue.pop(member_id, None)
+        queue[member_id] = (member_id, reason, enqueued_at, lane)
+
+        return
+
+    def dequeue(self, guild_id: int, member_id: int) -> None:
+        self._queues.get(guild_id, {}).pop(member_id, None)
+
+        return
+
+    def clear_queue(self, guild_id: int) -> None:
+        self._queues.pop(guild_id, None)
+
+        return
+
+    def open_session(self, guild_id: int, state: {str: int}) -> None:
+        self._sessions.setdefault(guild_id, {})[state["handler_id"]] = dict(state)
+
+        return
+
+    def close_session(self, guild_id: int, handler_id: int) -> None:
+        self._sessions.get(guild_id, {}).pop(handler_id, None)
+
+        return
+
+    def set_duty(self, guild_id: int, handler_id: int, on_duty: bool) -> None:
+        if on_duty: self._duty.setdefault(guild_id, set()).add(handler_id)
+        else: self._duty.get(guild_id, set()).discard(handler_id)
+
+        return
+
+    def load(self, guild_id: int) -> {str: list}:
+        return {
+            "queue": list(self._queues.get(guild_id, {}).values()),
+            "sessions": [dict(state) for state in self._sessions.get(guild_id, {}).values()],
+            "duty": list(self._duty.get(guild_id, ()))
+        }
+
+    def guilds(self) -> {int}:
+        return {guild_id for table in (self._queues, self._sessions, self._duty) for guild_id, rows in table.items() if rows}
+
+    def forget_guild(self, guild_id: int) -> None:
+        for table in (self._queues, self._sessions, self._duty): table.pop(guild_id, None)
+
+        return
+
+    def set_accepting(self, shard: str, accepting: int) -> None:
+        self._accepting[shard] = accepting
+
+        return
+
+    def total_accepting(self) -> int:
+        return sum(self._accepting.values())
+
+class OHRedisStore:
+    PRESENCE_TTL = OHStore.PRESENCE_TTL
+
+    def __init__(self, url: str):
+        if redis is None: raise RuntimeError("The redis:// state backend needs the redis package installed.")
+
+        # every call is a single round-trip to a local server, the same as the
+        # SQLite store's writes are a single append to its log
+        self._db = redis.Redis.from_url(url, decode_responses=True)
+
+    def enqueue(self, guild_id: int, member_id: int, reason: str, enqueued_at: float, lane: str) -> None:
+        # the sequence number keeps the queue's order across restarts, as the
+        # SQLite store's autoincrement key does
+        seq = self._db.incr("oh:seq")
+        self._db.hset("oh:%d:queue" % guild_id, member_id, dumps((seq, reason, enqueued_at, lane)))
+
+        return
+
+    def dequeue(self, guild_id: int, member_id: int) -> None:
+        self._db.hdel("oh:%d:queue" % guild_id, member_id)
+
+        return
+
+    def clear_queue(self, guild_id: int) -> None:
+        self._db.delete("oh:%d:queue" % guild_id)
+
+        return
+
+    def open_session(self, guild_id: int, state: {str: int}) -> None:
+        self._db.hset("oh:%d:sessions" % guild_id, state["handler_id"], dumps(state))
+
+        return
+
+    def close_session(self, guild_id: int, handler_id: int) -> None:
+        self._db.hdel("oh:%d:sessions" % guild_id, handler_id)
+
+        return
+
+    def set_duty(self, guild_id: int, handler_id: int, on_duty: bool) -> None:
+        if on_duty: self._db.sadd("oh:%d:duty" % guild_id, handler_id)
+        else: self._db.srem("oh:%d:duty" % guild_id, handler_id)
+
+        return
+
+    def load(self, guild_id: int) -> {str: list}:
+        queue = sorted(
+            (loads(value), int(member_id))
+            for member_id, value in self._db.hgetall("oh:%d:queue" % guild_id).items()
+        )
+        sessions = [loads(value) for value in self._db.hvals("oh:%d:sessions" % guild_id)]
+        duty = [int(handler_id) for handler_id in self._db.smembers("oh:%d:duty" % guild_id)]
+
+        return {
+            "queue": [(member_id, reason, enqueued_at, lane) for (_, reason, enqueued_at, lane), member_id in queue],
+            "sessions": sessions,
+            "duty": duty
+        }
+
+    def guilds(self) -> {int}:
+        # redis drops a hash or set once it's empty, so any key means there's state
+        return {int(key.split(":")[1]) for key in self._db.scan_iter("oh:*") if key.split(":")[1].isdigit()}
+
+    def forget_guild(self, guild_id: int) -> None:
+        self._db.delete(*("oh:%d:%s" % (guild_id, table) for table in ("queue", "sessions", "duty")))
+
+        return
+
+    def set_accepting(self, shard: str, accepting: int) -> None:
+        # the key expires on its own if the shard stops reporting
+        self._db.set("oh:accepting:%s" % shard, accepting, ex=self.PRESENCE_TTL)
+
+        return
+
+    def total_accepting(self) -> int:
+        keys = list(self._db.scan_iter("oh:accepting:*"))
+
+        return sum(int(value) for value in self._db.mget(keys) if value is not None) if keys else 0
+
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+:name: open_store()
+:preconditions: None.
+:postconditions: The state backend for the given URL is opened and returned:
+                 memory://, sqlite:///<path> or redis://<host>:<port>/<db>.
+"""""""""""""""""""""""""""""""""""""""""""""""""""
+def open_store(url: str):
+    if url.startswith("memory:"): return OHMemoryStore()
+    if url.startswith("sqlite:///"): return OHStore(url[len("sqlite:///"):])
+    if url.startswith("redis://"): return OHRedisStore(url)
+
+    raise ValueError("Unknown state backend <%s>." % url)
@@ -0,0 +1,90 @@
+from asyncio import ensure_future, get_event_loop, iscoroutine
+from heapq import heappop, heappush
+from itertools import count
+
+class OHTimers:
+    def __init__(self):
+        # one heap of (when, seq, key) for every guild's timers, with only the
+        # earliest armed on the event loop. Cancelled or replaced timers are
+        # left in the heap and skipped when they reach the top
+        self._heap = []
+        self._timers = {}
+        self._seq = count()
+        self._handle = None
+        self._armed_at = None
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: schedule()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The callback is called after delay seconds, replacing any timer
+                     already scheduled under the key. If it returns a coroutine,
+                     the coroutine is run as a task.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def schedule(self, key, delay: float, callback) -> None:
+        when = get_event_loop().time() + delay
+        seq = next(self._seq)
+
+        self._timers[key] = (seq, callback)
+        heappush(self._heap, (when, seq, key))
+        self._arm()
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: cancel()
+    :preconditions: OHTimers has been instantiated.
+    :postconditions: The timer scheduled under the key won't be called. Whether
+                     there was one is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def cancel(self, key) -> bool:
+        return self._timers.pop(key, None) is not None
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: pending()
+    :preconditions: OHTimers has been instantiated.
+    :postconditions: Whether a timer is scheduled under the key is returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def pending(self, key) -> bool:
+        return key in self._timers
+
+    def _live(self, seq: int, key) -> bool:
+        timer = self._timers.get(key)
+
+        return timer is not None and timer[0] == seq
+
+    def _arm(self) -> None:
+        while self._heap and not self._live(self._heap[0][1], self._heap[0][2]): heappop(self._heap)
+
+        if not self._heap:
+            if self._handle is not None: self._handle.cancel()
+            self._handle = self._armed_at = None
+            return
+
+        # only touch the loop when the earliest timer has changed
+        when = self._heap[0][0]
+        if self._armed_at == when: return
+
+        if self._handle is not None: self._handle.cancel()
+        self._handle = get_event_loop().call_at(when, self._fire)
+        self._armed_at = when
+
+        return
+
+    def _fire(self) -> None:
+        self._handle = self._armed_at = None
+        now = get_event_loop().time()
+
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, key = heappop(self._heap)
+            if not self._live(seq, key): continue
+
+            _, callback = self._timers.pop(key)
+            try:
+                result = callback()
+                if iscoroutine(result): ensure_future(result)
+            except Exception as error:
+                print("Timer <%s> failed: %s" % (key, error))
+
+        self._arm()
+
+        return
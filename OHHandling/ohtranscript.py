@@ -0,0 +1,297 @@
+import asyncio
+import discord
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, loads
+from os import path, remove
+from pytz import timezone
+from OHHandling.oharchive import OHArchive, OHArchiveEntry
+from OHHandling.ohattachments import OHAttachmentStore
+
+class OHTranscriptWriter:
+    # how many writes can wait for the disk before anyone recording a message
+    # has to wait too, and how many are handed to the thread at once
+    MAX_PENDING = 1000
+    BATCH_SIZE = 100
+
+    def __init__(self, archive: OHArchive, attachments: OHAttachmentStore = None, max_pending: int = MAX_PENDING):
+        self._archive = archive
+        self._attachments = attachments
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcripts")
+        self._queue = asyncio.Queue(max_pending)
+        self._worker = None
+
+        # only ever touched from the writer thread
+        self._files = {}
+        self._est = timezone("EST")
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: write()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The message's fields are queued to be formatted and appended
+                     to the log. Waits only if the write queue is full.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def write(self, file_name: str, message: discord.Message) -> None:
+        # only pull the raw fields out here; converting and formatting them is
+        # left to the writer thread
+        fields = (
+            message.id,
+            message.created_at,
+            message.author.display_name,
+            message.content,
+            tuple((attachment.id, attachment.filename, attachment.size, attachment.url)
+                  for attachment in message.attachments)
+        )
+        await self._submit(("write", file_name, fields, None))
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: finalize()
+    :preconditions: Called from within the bot's running event loop.
+    :postconditions: The log's attachments are downloaded into the attachment
+                     store, while their messages still exist. The log is then
+                     queued to be closed and moved into the archive under the given
+                     keys, referring to them by hash. The returned asyncio.Future
+                     resolves to its OHArchiveEntry once it has.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def finalize(self, file_name: str, keys: tuple) -> asyncio.Future:
+        loop = asyncio.get_event_loop()
+        done = loop.create_future()
+        digests = {}
+
+        if self._attachments is not None:
+            try:
+                # the attachments are read back from the log itself, after
+                # everything queued before them, so those recorded before a
+                # restart are included
+                listed = loop.create_future()
+                await self._submit(("attachments", file_name, None, listed))
+                attachments = await listed
+                if attachments: digests = await self._attachments.fetch_all(attachments)
+
+            # the log is still archived, keeping the attachments' links
+            except Exception as error:
+                print("Failed to store attachments of <%s>: %s" % (file_name, error))
+                digests = {}
+
+        await self._submit(("finalize", file_name, (keys, digests), done))
+
+        return done
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: recorded_ids()
+    :preconditions: Called from within the bot's running event loop, before anything
+                    more is written to the live log.
+    :postconditions: The ids of the messages in the live log are returned in the
+                     order they were written. Half a line left at its end by a crash
+                     is cut off first, so the next write starts on a line of its own.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def recorded_ids(self, file_name: str) -> [int]:
+        return await asyncio.get_event_loop().run_in_executor(self._executor, self._recorded_ids, file_name)
+
+    async def _submit(self, op: tuple) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+        await self._queue.put(op)
+
+        return
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+
+        while True:
+            # hand the thread everything that is waiting, up to a batch, so a
+            # busy session costs one thread hop per batch rather than per message
+            batch = [await self._queue.get()]
+            while not self._queue.empty() and len(batch) < self.BATCH_SIZE:
+                batch.append(self._queue.get_nowait())
+
+            # _apply() already handles each op's own errors, so this only guards
+            # against the batch as a whole failing; the worker carries on either way
+            try:
+                results = await loop.run_in_executor(self._executor, self._apply, batch)
+            except Exception as error:
+                print("Failed to apply %d transcript ops: %s" % (len(batch), error))
+                results = [None] * len(batch)
+
+            for (_, _, _, done), result in zip(batch, results):
+                if done is not None and not done.done(): done.set_result(result)
+
+    def _apply(self, batch: [tuple]) -> list:
+        results = []
+
+        for kind, file_name, fields, _ in batch:
+            try:
+                if kind == "write": results.append(self._write(file_name, fields))
+                elif kind == "attachments": results.append(self._list_attachments(file_name))
+                else: results.append(self._finalize(file_name, *fields))
+
+            # one bad log shouldn't take every other session's down with it, and
+            # whoever is waiting on this op is still answered
+            except Exception as error:
+                print("Failed to %s transcript <%s>: %s" % (kind, file_name, error))
+                results.append(None)
+
+        return results
+
+    def _write(self, file_name: str, fields: tuple) -> None:
+        file = self._files.get(file_name)
+        if file is None: file = self._files[file_name] = open(file_name + ".part", 'a')
+
+        message_id, created_at, author, content, attachments = fields
+
+        # convert the message's datetime instance from utc to est for proper
+        # timestamps in the log
+        message_est_converted = created_at.astimezone(self._est)
+
+        file.write(dumps({
+            "id": message_id,
+            "time": "%02d:%02d" % (message_est_converted.hour, message_est_converted.minute),
+            "author": author,
+            "content": content,
+            "attachments": [
+                {"id": attachment_id, "name": name, "size": size, "url": url}
+                for attachment_id, name, size, url in attachments
+            ]
+        }) + "\n")
+
+        return
+
+    def _recorded_ids(self, file_name: str) -> [int]:
+        ids = []
+
+        try:
+            with open(file_name + ".part", 'r+b') as file:
+                data = file.read()
+
+                # a crash can leave half a line at the end; its message is
+                # written again when the session catches up
+                complete = data.rfind(b"\n") + 1
+                if complete < len(data): file.truncate(complete)
+
+        # nothing was ever written, or the file is unreadable
+        except OSError:
+            return ids
+
+        for line in data[:complete].splitlines():
+            try:
+                ids.append(loads(line)["id"])
+            except (ValueError, KeyError, TypeError):
+                continue
+
+        return ids
+
+    def _list_attachments(self, file_name: str) -> [dict]:
+        file = self._files.get(file_name)
+        if file is not None: file.flush()
+
+        attachments = []
+
+        try:
+            with open(file_name + ".part") as file: lines = list(file)
+
+        # nothing was ever written, which _finalize() reports
+        except OSError:
+            return attachments
+
+        for line in lines:
+            try:
+                recorded = loads(line).get("attachments")
+
+            # a crash can leave half a line behind
+            except ValueError:
+                continue
+
+            # logs started before attachments were stored only have a count
+            if isinstance(recorded, list): attachments.extend(recorded)
+
+        return attachments
+
+    def _finalize(self, file_name: str, keys: tuple, digests: {int: str}) -> OHArchiveEntry:
+        file = self._files.pop(file_name, None)
+        if file is not None: file.close()
+
+        # the live log becomes one compressed member of the guild's archive
+        guild_id, student_id, handler_id, date = keys
+        with open(file_name + ".part", 'rb') as file: data = file.read()
+        if digests: data = self._link_attachments(data, digests)
+
+        entry = self._archive.store(guild_id, path.basename(file_name), student_id, handler_id, date, data)
+        remove(file_name + ".part")
+
+        return entry
+
+    def _link_attachments(self, data: bytes, digests: {int: str}) -> bytes:
+        lines = []
+
+        # stored attachments are referred to by the hash they're stored under;
+        # any that weren't keep their link instead
+        for line in data.decode().splitlines():
+            try:
+                record = loads(line)
+            except ValueError:
+                lines.append(line)
+                continue
+
+            # logs started before attachments were stored only have a count
+            recorded = record.get("attachments")
+            if not isinstance(recorded, list): recorded = ()
+
+            for attachment in recorded:
+                digest = digests.get(attachment["id"])
+                if digest is None: continue
+
+                attachment["sha256"] = digest
+                del attachment["url"]
+
+            lines.append(dumps(record))
+
+        return ("\n".join(lines) + "\n").encode()
+
+class OHTranscript:
+    def __init__(self, writer: OHTranscriptWriter, file_name: str, guild_id: int,
+                 student_id: int, handler_id: int, date: str):
+        # the log is written to a .part file while the session is live and only
+        # moves into the archive once it has been finalized
+        self._writer = writer
+        self._file_name = file_name
+        self._keys = (guild_id, student_id, handler_id, date)
+        self._seen = set()
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: resume()
+    :preconditions: Nothing has been appended to this OHTranscript yet, and its live
+                    log already has the given messages in it.
+    :postconditions: Those messages are never written to the log again.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def resume(self, message_ids: [int]) -> None:
+        self._seen.update(message_ids)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: append()
+    :preconditions: This OHTranscript has not been finalized.
+    :postconditions: The discord.Message instance is queued to be written to the
+                     end of the log as one JSON line, unless it already has been.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def append(self, message: discord.Message) -> None:
+        # a message can reach us both from on_message and from catching up on
+        # history, so only write it the first time
+        if message.id in self._seen: return
+        self._seen.add(message.id)
+
+        await self._writer.write(self._file_name, message)
+
+        return
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: finalize()
+    :preconditions: This OHTranscript has not been finalized.
+    :postconditions: The log's attachments are stored, and the log is queued to be
+                     closed and moved into the archive. The returned asyncio.Future
+                     resolves once it has.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def finalize(self) -> asyncio.Future:
+        return await self._writer.finalize(self._file_name, self._keys)
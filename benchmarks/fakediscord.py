@@ -0,0 +1,295 @@
+import asyncio
+import discord
+import random
+from datetime import datetime, timezone
+from itertools import count
+from types import SimpleNamespace
+
+# stand-ins for the parts of discord.py that OHHandling touches. Every REST call
+# goes through FakeHTTP.request() the way discord.py's own models go through
+# HTTPClient.request(), so OHMetrics.instrument_http() counts them too.
+
+_ids = count(10 ** 17)
+
+class FakeRoute:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+
+class FakeHTTP:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, rate_limit: float = 0.0,
+                 retry_after: float = 0.25, rng: random.Random = None):
+        self._latency = latency
+        self._jitter = jitter
+        self._rate_limit = rate_limit
+        self._retry_after = retry_after
+        self._rng = rng or random.Random()
+
+        self.calls = {}
+        self.rate_limited = {}
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: request()
+    :preconditions: Called from within the running event loop.
+    :postconditions: Waits out the simulated round-trip. A simulated 429 is waited
+                     out and retried, the same way discord.py's HTTPClient does.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    async def request(self, route: FakeRoute, **kwargs) -> None:
+        key = "%s %s" % (route.method, route.path)
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+        while True:
+            await asyncio.sleep(max(0.0, self._rng.gauss(self._latency, self._jitter)))
+            if self._rng.random() >= self._rate_limit: return
+
+            self.rate_limited[key] = self.rate_limited.get(key, 0) + 1
+            await asyncio.sleep(self._retry_after)
+
+def _precedes(first, second) -> bool:
+    # before= and after= take a message, an object with an id, or a datetime
+    # (naive ones are UTC), and None leaves that side open
+    if first is None or second is None: return True
+
+    if isinstance(first, datetime) or isinstance(second, datetime):
+        times = [point if isinstance(point, datetime) else point.created_at for point in (first, second)]
+        times = [time.replace(tzinfo=timezone.utc) if time.tzinfo is None else time for time in times]
+        return times[0] < times[1]
+
+    return first.id < second.id
+
+class _FakeObject:
+    def __init__(self, http: FakeHTTP, name: str = None):
+        self.id = next(_ids)
+        self.name = name
+        self.created_at = datetime.now(timezone.utc)
+        self._http = http
+
+    def __eq__(self, other):
+        return isinstance(other, _FakeObject) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class FakeRole(_FakeObject):
+    def __init__(self, http: FakeHTTP, guild, name: str):
+        super().__init__(http, name)
+        self.guild = guild
+
+    async def edit(self, **fields) -> None:
+        await self._http.request(FakeRoute("PATCH", "/guilds/{guild_id}/roles/{role_id}"))
+        self.name = fields.get("name", self.name)
+
+    async def delete(self) -> None:
+        await self._http.request(FakeRoute("DELETE", "/guilds/{guild_id}/roles/{role_id}"))
+        self.guild._forget(self)
+
+class FakeMessage(_FakeObject):
+    def __init__(self, http: FakeHTTP, channel, author, content: str):
+        super().__init__(http)
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.attachments = []
+        self.guild = getattr(channel, "guild", None)
+
+    async def edit(self, **fields) -> None:
+        await self._http.request(FakeRoute("PATCH", "/channels/{channel_id}/messages/{message_id}"))
+        self.content = fields.get("content", self.content)
+
+    async def add_reaction(self, emoji: str) -> None:
+        await self._http.request(FakeRoute("PUT", "/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me"))
+
+    async def delete(self) -> None:
+        await self._http.request(FakeRoute("DELETE", "/channels/{channel_id}/messages/{message_id}"))
+
+class FakeChannel(_FakeObject):
+    def __init__(self, http: FakeHTTP, guild, name: str, kind: str, category=None):
+        super().__init__(http, name)
+        self.guild = guild
+        self.kind = kind
+        self.category = category
+        self.messages = []
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        await self._http.request(FakeRoute("POST", "/channels/{channel_id}/messages"))
+        message = FakeMessage(self._http, self, self.guild.me, content)
+        self.messages.append(message)
+
+        return message
+
+    def history(self, limit: int = 100, before=None, after=None, oldest_first: bool = None):
+        # the same defaults as discord.py: at most 100 messages, newest first
+        # unless reading after a message or a time
+        if oldest_first is None: oldest_first = after is not None
+        messages = [message for message in self.messages if _precedes(after, message) and _precedes(message, before)]
+        if limit is not None: messages = messages[:limit] if oldest_first else messages[-limit:]
+        if not oldest_first: messages.reverse()
+
+        http = self._http
+
+        async def pages():
+            await http.request(FakeRoute("GET", "/channels/{channel_id}/messages"))
+            for message in messages: yield message
+
+        return pages()
+
+    async def edit(self, **fields) -> None:
+        await self._http.request(FakeRoute("PATCH", "/channels/{channel_id}"))
+        self.name = fields.get("name", self.name)
+
+    async def clone(self, name: str = None) -> "FakeChannel":
+        await self._http.request(FakeRoute("POST", "/guilds/{guild_id}/channels"))
+        return self.guild._add_channel(FakeChannel(self._http, self.guild, name or self.name, self.kind, self.category))
+
+    async def delete(self) -> None:
+        await self._http.request(FakeRoute("DELETE", "/channels/{channel_id}"))
+        self.guild._forget(self)
+
+class FakeMember(_FakeObject):
+    def __init__(self, http: FakeHTTP, guild, name: str, roles: list = ()):
+        super().__init__(http, name)
+        self.guild = guild
+        self.display_name = name
+        self.mention = "<@%d>" % self.id
+        self.avatar_url = ""
+        self.roles = list(roles)
+        self.bot = False
+        self.dms = []
+
+    async def send(self, content: str = None, **kwargs) -> None:
+        await self._http.request(FakeRoute("POST", "/channels/{channel_id}/messages"))
+        self.dms.append(content)
+
+    async def add_roles(self, *roles) -> None:
+        for role in roles:
+            await self._http.request(FakeRoute("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}"))
+            if role not in self.roles: self.roles.append(role)
+
+    async def remove_roles(self, *roles) -> None:
+        for role in roles:
+            await self._http.request(FakeRoute("DELETE", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}"))
+            if role in self.roles: self.roles.remove(role)
+
+class FakeGuild(_FakeObject):
+    def __init__(self, http: FakeHTTP, name: str):
+        super().__init__(http, name)
+        self.default_role = FakeRole(http, self, "@everyone")
+        self.roles = [self.default_role]
+        self.channels = []
+        self.members = []
+        self._members_by_id = {}
+        self.me = self.add_member("Office Hours")
+
+    @property
+    def text_channels(self) -> list:
+        return [channel for channel in self.channels if channel.kind == "text"]
+
+    @property
+    def categories(self) -> list:
+        return [channel for channel in self.channels if channel.kind == "category"]
+
+    def get_member(self, member_id: int) -> FakeMember:
+        return self._members_by_id.get(member_id)
+
+    def get_role(self, role_id: int) -> FakeRole:
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_channel(self, channel_id: int) -> FakeChannel:
+        return next((channel for channel in self.channels if channel.id == channel_id), None)
+
+    async def fetch_member(self, member_id: int) -> FakeMember:
+        await self._http.request(FakeRoute("GET", "/guilds/{guild_id}/members/{user_id}"))
+
+        # discord answers 404 Unknown Member for someone who isn't in the guild
+        member = self.get_member(member_id)
+        if member is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), {"code": 10007, "message": "Unknown Member"})
+
+        return member
+
+    async def create_role(self, name: str, **kwargs) -> FakeRole:
+        await self._http.request(FakeRoute("POST", "/guilds/{guild_id}/roles"))
+        role = FakeRole(self._http, self, name)
+        self.roles.append(role)
+
+        return role
+
+    async def create_category(self, name: str, overwrites: dict = None, **kwargs) -> FakeChannel:
+        await self._http.request(FakeRoute("POST", "/guilds/{guild_id}/channels"))
+        return self._add_channel(FakeChannel(self._http, self, name, "category"))
+
+    async def create_text_channel(self, name: str, category=None, **kwargs) -> FakeChannel:
+        await self._http.request(FakeRoute("POST", "/guilds/{guild_id}/channels"))
+        return self._add_channel(FakeChannel(self._http, self, name, "text", category))
+
+    async def create_voice_channel(self, name: str, category=None, **kwargs) -> FakeChannel:
+        await self._http.request(FakeRoute("POST", "/guilds/{guild_id}/channels"))
+        return self._add_channel(FakeChannel(self._http, self, name, "voice", category))
+
+    def add_member(self, name: str, roles: list = ()) -> FakeMember:
+        member = FakeMember(self._http, self, name, roles)
+        self.members.append(member)
+        self._members_by_id[member.id] = member
+
+        return member
+
+    def _add_channel(self, channel: FakeChannel) -> FakeChannel:
+        self.channels.append(channel)
+
+        return channel
+
+    def _forget(self, thing) -> None:
+        if thing in self.roles: self.roles.remove(thing)
+        if thing in self.channels: self.channels.remove(thing)
+
+class FakeContext:
+    def __init__(self, guild: FakeGuild, author: FakeMember, channel: FakeChannel, content: str = ""):
+        self.guild = guild
+        self.author = author
+        self.channel = channel
+        self.message = FakeMessage(guild._http, channel, author, content)
+        self.message.created_at = datetime.now(timezone.utc)
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
+
+class FakeBot:
+    def __init__(self, http: FakeHTTP):
+        self.http = http
+        self.guilds = []
+        self.user = None
+
+    def get_guild(self, guild_id: int) -> FakeGuild:
+        return next((guild for guild in self.guilds if guild.id == guild_id), None)
+
+    def get_user(self, user_id: int) -> FakeMember:
+        for guild in self.guilds:
+            member = guild.get_member(user_id)
+            if member is not None: return member
+
+        return None
+
+    async def fetch_user(self, user_id: int) -> FakeMember:
+        await self.http.request(FakeRoute("GET", "/users/{user_id}"))
+        return self.get_user(user_id)
+
+    async def change_presence(self, **kwargs) -> None:
+        await self.http.request(FakeRoute("GATEWAY", "presence_update"))
+
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    :name: add_guild()
+    :preconditions: FakeBot has been instantiated.
+    :postconditions: A guild with the roles and channel OHHandling expects is
+                     created and returned.
+    """""""""""""""""""""""""""""""""""""""""""""""""""
+    def add_guild(self, name: str) -> FakeGuild:
+        guild = FakeGuild(self.http, name)
+        self.user = guild.me
+
+        for role in ("Handler", "On Duty", "Queueable"): guild.roles.append(FakeRole(self.http, guild, role))
+        category = guild._add_channel(FakeChannel(self.http, guild, "Office Hours", "category"))
+        guild._add_channel(FakeChannel(self.http, guild, "queue-reasons", "text", category))
+
+        self.guilds.append(guild)
+
+        return guild
@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from OHHandling.OHHandling import OHHandling
+from benchmarks.fakediscord import FakeBot, FakeContext, FakeHTTP, FakeMessage
+
+# drives the real OHHandling cog through a scripted office hours trace against
+# the fakes in fakediscord.py. Commands are invoked through their callbacks, so
+# discord.py's role checks are skipped but every OHHandling decorator runs.
+#
+#   python -m benchmarks.loadtest --students 300 --handlers 8
+
+def _percentile(samples: [float], q: float) -> float:
+    if not samples: return 0.0
+
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class _Trace:
+    def __init__(self, cog: OHHandling, args: argparse.Namespace, rng: random.Random):
+        self.cog = cog
+        self.args = args
+        self.rng = rng
+        self.latencies = {}
+        self.served = 0
+        self.left = 0
+
+    async def command(self, name: str, ctx: FakeContext, *args) -> None:
+        started = perf_counter()
+        await getattr(self.cog, "_" + name).callback(self.cog, ctx, *args)
+        self.latencies.setdefault(name, []).append(perf_counter() - started)
+
+    def session_channel(self, guild, handler) -> object:
+        session = self.cog._open_sessions[guild.id].by_handler(handler.id)
+        return session.get_text_id() if session is not None else None
+
+    async def student(self, guild, channel, student) -> None:
+        # students arrive as a poisson process and some give up waiting
+        await asyncio.sleep(self.rng.expovariate(self.args.arrival_rate))
+
+        # a student turned away before office hours open would never be served
+        while not self.cog._handlers_on_duty[guild.id]: await asyncio.sleep(0.01)
+
+        lane = self.rng.choice(list(self.cog._queues[guild.id].LANES))
+        await self.command("enqueue", FakeContext(guild, student, channel), lane, "help", "with", "lab")
+
+        if self.rng.random() < self.args.leave:
+            await asyncio.sleep(self.rng.uniform(0, self.args.session_time * 4))
+
+            if self.cog._queues[guild.id].check(student.id):
+                await self.command("dequeue", FakeContext(guild, student, channel))
+                self.left += 1
+
+    async def handler(self, guild, channel, handler, students: int) -> None:
+        await self.command("on_duty", FakeContext(guild, handler, channel))
+
+        while self.served + self.left < students:
+            if self.cog._queues[guild.id].is_empty():
+                await asyncio.sleep(0.05)
+                continue
+
+            await self.command("accept", FakeContext(guild, handler, channel))
+            channel_id = self.session_channel(guild, handler)
+            if channel_id is None: continue
+
+            self.served += 1
+
+            # chat in the session's text channel for a while
+            text = guild.get_channel(channel_id)
+            for i in range(self.args.messages):
+                await asyncio.sleep(self.args.session_time / max(self.args.messages, 1))
+                message = await text.send("message %d" % i)
+                await self.cog.on_message(message)
+
+            await self.command("close", FakeContext(guild, handler, text))
+
+        await self.command("current_queue", FakeContext(guild, handler, channel))
+
+async def run(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    http = FakeHTTP(args.latency, args.jitter, args.rate_limit, rng=rng)
+    bot = FakeBot(http)
+    guilds = [bot.add_guild("Course %d" % i) for i in range(args.guilds)]
+
+    OHHandling.USE_ROOM_POOL = args.room_pool
+    OHHandling.STATE_BACKEND = args.state
+    cog = OHHandling(bot)
+    await cog.on_ready()
+    trace = _Trace(cog, args, rng)
+
+    jobs = []
+    for guild in guilds:
+        cog._queues[guild.id].set_position_window(args.debounce)
+        channel = next(channel for channel in guild.text_channels if channel.name == "queue-reasons")
+        handler_role = next(role for role in guild.roles if role.name == "Handler")
+        queueable_role = next(role for role in guild.roles if role.name == "Queueable")
+
+        handlers = [guild.add_member("Handler %d" % i, [handler_role]) for i in range(args.handlers)]
+        if args.digest > 0: cog._digest_windows.update((handler.id, args.digest) for handler in handlers)
+        students = [guild.add_member("Student %d" % i, [queueable_role]) for i in range(args.students)]
+
+        jobs += [trace.handler(guild, channel, handler, len(students) * len(guilds)) for handler in handlers]
+        jobs += [trace.student(guild, channel, student) for student in students]
+
+    started = perf_counter()
+    await asyncio.gather(*jobs)
+    elapsed = perf_counter() - started
+
+    # let the last debounced position updates go out before counting messages
+    await asyncio.sleep(args.debounce)
+    for digest in cog._digests.values(): digest.stop()
+    await cog._notifier.drain()
+
+    dms = sum(len(member.dms) for guild in guilds for member in guild.members)
+    position_dms = sum(
+        1 for guild in guilds for member in guild.members for dm in member.dms
+        if dm and dm.startswith("Your new position")
+    )
+    handler_dms = sum(len(member.dms) for guild in guilds for member in guild.members if member.name.startswith("Handler"))
+
+    print("\n%d guilds, %d handlers and %d students each, %.0fms +/- %.0fms REST latency, %.1f%% 429s" % (
+            args.guilds, args.handlers, args.students, args.latency * 1000, args.jitter * 1000, args.rate_limit * 100
+        ))
+    print("wall time: %.2fs, served: %d, left: %d, throughput: %.1f sessions/s" % (
+            elapsed, trace.served, trace.left, trace.served / elapsed
+        ))
+
+    print("\ncommand latency (ms):     p50      p95      p99      n")
+    for name, samples in sorted(trace.latencies.items()):
+        print("  %-20s %8.1f %8.1f %8.1f %6d" % (
+                name,
+                _percentile(samples, 0.5) * 1000,
+                _percentile(samples, 0.95) * 1000,
+                _percentile(samples, 0.99) * 1000,
+                len(samples)
+            ))
+
+    print("\nmessages: %d DMs (%d position updates, %d to handlers), %d coalesced, %d debounced away" % (
+            dms,
+            position_dms,
+            handler_dms,
+            cog._notifier.coalesced,
+            sum(cog._queues[guild.id].position_stats()["suppressed"] for guild in guilds)
+        ))
+    print("REST: %d calls, %d rate limited" % (sum(http.calls.values()), sum(http.rate_limited.values())))
+    for route, n in sorted(http.calls.items(), key=lambda item: item[1], reverse=True):
+        print("  %-55s %6d" % (route, n))
+
+async def restore(args: argparse.Namespace) -> None:
+    # a session is left open while the bot is down and more is said in it than
+    # a single page of history; once restored, its transcript has to have all
+    # of it. Always against SQLite, since the state has to outlive the cog
+    http = FakeHTTP(args.latency, args.jitter, 0.0, rng=random.Random(args.seed))
+    bot = FakeBot(http)
+    guild = bot.add_guild("Restored")
+
+    OHHandling.STATE_BACKEND = "sqlite:///OHHandling/restore.db"
+    cog = OHHandling(bot)
+    await cog.on_ready()
+
+    channel = next(channel for channel in guild.text_channels if channel.name == "queue-reasons")
+    handler = guild.add_member("Handler", [next(role for role in guild.roles if role.name == "Handler")])
+    student = guild.add_member("Student", [next(role for role in guild.roles if role.name == "Queueable")])
+    command = lambda cog, name, member, channel, *args: getattr(cog, "_" + name).callback(
+                  cog, FakeContext(guild, member, channel), *args)
+
+    await command(cog, "on_duty", handler, channel)
+    await command(cog, "enqueue", student, channel, "help")
+    await command(cog, "accept", handler, channel)
+    text = next(channel for channel in guild.text_channels if channel.name == "session-text")
+
+    # nothing said from here on reaches the old cog
+    for i in range(args.missed): text.messages.append(FakeMessage(http, text, student, "missed %d" % i))
+
+    cog = OHHandling(bot)
+    await cog.on_ready()
+    await command(cog, "close", handler, text)
+    await asyncio.sleep(0.1)
+
+    entries = cog._archive.find(guild.id, student_id=student.id)
+    lines = cog._archive.read(guild.id, entries[-1]).decode().splitlines() if entries else []
+    recovered = sum(1 for line in lines if '"missed ' in line)
+
+    print("\nrestore: %d of %d messages sent while the bot was down made it into the transcript" % (
+            recovered, args.missed
+        ))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay an office hours trace against a fake Discord.")
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--students", type=int, default=150)
+    parser.add_argument("--handlers", type=int, default=6)
+    parser.add_argument("--arrival-rate", type=float, default=50.0, help="students arriving per second, per guild")
+    parser.add_argument("--leave", type=float, default=0.1, help="chance a student leaves the queue on their own")
+    parser.add_argument("--session-time", type=float, default=0.2, help="seconds each session stays open")
+    parser.add_argument("--messages", type=int, default=5, help="messages sent in each session")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean simulated REST round-trip in seconds")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--rate-limit", type=float, default=0.01, help="chance a REST call is answered with a 429")
+    parser.add_argument("--debounce", type=float, default=0.5, help="position update window in seconds")
+    parser.add_argument("--digest", type=float, default=0.0, help="handler notification digest window in seconds")
+    parser.add_argument("--room-pool", action="store_true")
+    parser.add_argument("--state", default=OHHandling.STATE_BACKEND, help="state backend URL, e.g. memory://")
+    parser.add_argument("--missed", type=int, default=150,
+                        help="messages sent in a session while the bot is down, then caught up on restore (0 to skip)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # the cog keeps its database, logs and metrics relative to the working
+    # directory, so run somewhere that gets thrown away afterwards
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "OHHandling", "sessionlogs"))
+        os.chdir(directory)
+        asyncio.run(run(args))
+        if args.missed > 0: asyncio.run(restore(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import gc
+import tracemalloc
+from sys import getsizeof
+
+from OHHandling.ohnotifier import OHNotifier
+from OHHandling.ohqueue import OHQueue
+from OHHandling.ohqueueentry import OHQueueEntry
+from OHHandling.ohstore import OHMemoryStore
+
+# measures how much memory each queued student costs OHQueue: their entry and
+# their share of the lanes' indexes, with the reason and name included.
+#
+#   python -m benchmarks.queuememory --students 10000
+
+def _queue_bytes(students: int, reason: str) -> int:
+    lanes = list(OHQueue.LANES)
+
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+
+    queue = OHQueue(None, OHNotifier(), OHMemoryStore(), 1)
+    for i in range(students):
+        # each student's name and reason are their own strings, as they are when
+        # they come in with !enqueue, so their bytes are counted too
+        queue.restore(OHQueueEntry(10 ** 17 + i, "Student %d" % i, "%s %d" % (reason, i), float(i), lanes[i % len(lanes)]))
+
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    del queue
+
+    return used
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the memory used per queued student.")
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--reason", default="help with lab 3, my linked list segfaults")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    empty = _queue_bytes(0, args.reason)
+    full = _queue_bytes(args.students, args.reason)
+    tracemalloc.stop()
+
+    entry = OHQueueEntry(10 ** 17, "Student 0", args.reason, 0.0, OHQueue.DEFAULT_LANE)
+    print("%d students: %.0f bytes per queued student (%d for an empty queue)" % (
+            args.students, (full - empty) / args.students, empty
+        ))
+    print("  OHQueueEntry itself: %d bytes, without its name and reason" % getsizeof(entry))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 import discord
+import os
 from discord.ext import commands
 
-client = commands.Bot(command_prefix=commands.when_mentioned_or("!"))
-TOKEN = ""  # Token here
+# set OH_SHARD_COUNT to run the bot sharded, and OH_SHARD_IDS (e.g. "0,1") to
+# run only some of the shards in this process. Shard processes should share a
+# state backend, see OH_STATE_BACKEND in the README
+SHARD_COUNT = os.environ.get("OH_SHARD_COUNT")
+SHARD_IDS = os.environ.get("OH_SHARD_IDS")
+
+if SHARD_COUNT is None:
+    client = commands.Bot(command_prefix=commands.when_mentioned_or("!"))
+else:
+    client = commands.AutoShardedBot(
+                command_prefix=commands.when_mentioned_or("!"),
+                shard_count=int(SHARD_COUNT),
+                shard_ids=[int(shard_id) for shard_id in SHARD_IDS.split(",")] if SHARD_IDS else None
+            )
+TOKEN = os.environ.get("OH_TOKEN", "")  # Token here
 
 @client.event
 async def on_ready():
-    pres = discord.Activity(name="0 queues.", type=discord.ActivityType.watching)
-    await client.change_presence(status=discord.Status.dnd, activity=pres)
+    # the OHHandling cog sets the presence, counting the queues on every shard
     print("Office Hours Ready")
 
 